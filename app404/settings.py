@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 import environ
 
@@ -7,6 +8,8 @@ env = environ.Env(
     DEBUG=(bool, True),
     JWT_ACCESS_TTL_SECONDS=(int, 15 * 60),
     JWT_REFRESH_TTL_SECONDS=(int, 7 * 24 * 60 * 60),
+    JWT_USER_CACHE_SIZE=(int, 10_000),
+    JWT_USER_CACHE_TTL_SECONDS=(int, 60),
 )
 environ.Env.read_env(BASE_DIR / ".env")
 
@@ -27,8 +30,8 @@ INSTALLED_APPS = [
 
     # 3rd-party
     "corsheaders",
-    "rest_framework",
-    "django_filters",
+    # Only team9 uses DRF; other deployments skip loading it.
+    *(["rest_framework", "django_filters"] if "team9" in TEAM_APPS else []),
 
     # Local
     "core",
@@ -36,9 +39,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.AuthSubrequestMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.CompressionMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.middleware.RequestMetricsMiddleware",
+    "core.middleware.RateLimitMiddleware",
+    "core.middleware.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
 
@@ -49,13 +57,46 @@ MIDDLEWARE = [
 
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.RequestProfilerMiddleware",
 ]
 
+# Leaner chains for path prefixes that don't need the full MIDDLEWARE stack
+# (see core.handlers). JSON APIs authenticate purely via JWT, so they skip
+# sessions, CSRF cookies, Django's session auth and messages. That includes
+# the staff endpoints (/api/metrics/, /api/db/connections/,
+# /api/users/resolve/): a staff member signed in to the admin with a session
+# only must sign in through /auth/ (JWT cookies) or send X-Internal-Token.
+MIDDLEWARE_PROFILES = {
+    "api": {
+        "PREFIXES": ["/api/", *(f"/{t}/api/" for t in TEAM_APPS)],
+        "MIDDLEWARE": [
+            "core.middleware.AuthSubrequestMiddleware",
+            "corsheaders.middleware.CorsMiddleware",
+            "django.middleware.security.SecurityMiddleware",
+            "core.middleware.CompressionMiddleware",
+            "core.middleware.RequestMetricsMiddleware",
+            "core.middleware.RateLimitMiddleware",
+            "django.middleware.common.CommonMiddleware",
+            "core.middleware.ReplicaPinMiddleware",
+            "core.middleware.JWTAuthenticationMiddleware",
+            "core.middleware.RequestProfilerMiddleware",
+        ],
+    },
+} if env.bool("MIDDLEWARE_PROFILES_ENABLED", default=True) else {}
+
 ROOT_URLCONF = "app404.urls"
 
+# Test clients served through core.handlers, like production (core.testing).
+TEST_RUNNER = "core.testing.DiscoverRunner"
+
+# Import each team's URLconf (views, service clients...) on the first request
+# under its prefix instead of at startup; see core.lazy_urls for the caveats.
+LAZY_TEAM_URLS = env.bool("LAZY_TEAM_URLS", default=False)
+
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates that reports render time to core.metrics.
+        "BACKEND": "core.metrics.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -81,6 +122,86 @@ for t in TEAM_APPS:
     default_url = f"sqlite:///{BASE_DIR / t / (t + '.sqlite3')}"
     DATABASES[t] = env.db(key, default=default_url)
 
+# Read replicas (core.db_router): TEAMN_REPLICA_DATABASE_URL takes one or more
+# comma-separated URLs, added as aliases teamN_replica1, teamN_replica2...
+# Reads are spread over them; after a write, that client's reads of the team
+# stay on the primary for DB_REPLICA_PIN_SECONDS (replication lag budget).
+DATABASE_REPLICAS = {}
+for t in TEAM_APPS:
+    for i, url in enumerate(env.list(f"{t.upper()}_REPLICA_DATABASE_URL", default=[]), start=1):
+        alias = f"{t}_replica{i}"
+        DATABASES[alias] = {**env.db_url_config(url), "TEST": {"MIRROR": t}}
+        DATABASE_REPLICAS.setdefault(t, []).append(alias)
+DB_REPLICA_PIN_SECONDS = env.int("DB_REPLICA_PIN_SECONDS", default=5)
+
+# Cache backend (CACHE_URL): locmemcache:// is per process; filecache:///path
+# or sqlitecache:////path/cache.sqlite3 are shared by the workers on one host
+# (the latter is a "cache" database alias; migrate_all creates its table);
+# redis://host:6379/1 is shared by all replicas.
+CACHE_URL = env("CACHE_URL", default="locmemcache://")
+if CACHE_URL.startswith("sqlitecache:///"):
+    DATABASES["cache"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": CACHE_URL[len("sqlitecache:///"):]}
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "django_cache"}}
+else:
+    CACHES = {"default": env.cache_url_config(CACHE_URL)}
+CACHES["default"]["KEY_PREFIX"] = "app404"
+
+# core.cache.cache_page_per_user: static pages are cached per auth state for
+# PAGE_CACHE_SECONDS. Set PAGE_CACHE_VERSION (e.g. the image tag) per deploy
+# so shared caches don't serve the previous release's pages.
+PAGE_CACHE_SECONDS = env.int("PAGE_CACHE_SECONDS", default=600)
+PAGE_CACHE_VERSION = env("PAGE_CACHE_VERSION", default="1")
+
+# Persistent connections (see core.db_connections). Each alias takes
+# TEAMN_DB_CONN_MAX_AGE / TEAMN_DB_CONN_HEALTH_CHECKS, then ?conn_max_age= in
+# its URL, then these defaults. Connections idle longer than DB_CONN_MAX_IDLE
+# are closed at the end of the next request on the same thread. Under ASGI
+# (APP_SERVER, see gunicorn.conf.py) queries run on short-lived executor
+# threads whose persistent connections are never closed, so the default
+# there is 0: a connection per request, closed when it finishes.
+APP_SERVER = env("APP_SERVER", default="asgi")
+DB_CONN_MAX_AGE = env.int("DB_CONN_MAX_AGE", default=0 if APP_SERVER == "asgi" else 300)
+DB_CONN_HEALTH_CHECKS = env.bool("DB_CONN_HEALTH_CHECKS", default=True)
+DB_CONN_MAX_IDLE = env.int("DB_CONN_MAX_IDLE", default=60)
+
+for alias, db in DATABASES.items():
+    prefix = "" if alias == "default" else f"{alias.upper()}_"
+    db["CONN_MAX_AGE"] = env.int(f"{prefix}DB_CONN_MAX_AGE", default=db.get("CONN_MAX_AGE", DB_CONN_MAX_AGE))
+    db["CONN_HEALTH_CHECKS"] = env.bool(f"{prefix}DB_CONN_HEALTH_CHECKS", default=DB_CONN_HEALTH_CHECKS)
+
+# GET /api/health/ready/ (core.readiness) probes these aliases (empty: all)
+# concurrently, each within READINESS_PROBE_TIMEOUT seconds, and reuses the
+# result for READINESS_CACHE_SECONDS. It answers 503 when one of the
+# critical aliases is down; /api/health/ stays a plain liveness check.
+READINESS_DATABASES = env.list("READINESS_DATABASES", default=[])
+READINESS_CRITICAL_DATABASES = env.list("READINESS_CRITICAL_DATABASES", default=["default"])
+READINESS_PROBE_TIMEOUT = env.float("READINESS_PROBE_TIMEOUT", default=2.0)
+READINESS_CACHE_SECONDS = env.float("READINESS_CACHE_SECONDS", default=3.0)
+
+# Pragmas applied to every new SQLite connection (core.sqlite). WAL lets team
+# request threads read while background threads write; busy_timeout makes
+# writers wait for the lock instead of failing with "database is locked".
+# SQLITE_PRAGMAS="synchronous=full" overrides entries for every alias and
+# TEAMN_SQLITE_PRAGMAS (DEFAULT_SQLITE_PRAGMAS) for one; an empty value
+# leaves that pragma at SQLite's default. `manage.py sqlite_pragmas` shows
+# the effective values.
+_SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -20000,  # KiB
+    "temp_store": "memory",
+}
+SQLITE_PRAGMAS = {
+    alias: {
+        **_SQLITE_PRAGMAS,
+        **env.dict("SQLITE_PRAGMAS", default={}),
+        **env.dict(f"{alias.upper()}_SQLITE_PRAGMAS", default={}),
+    }
+    for alias in DATABASES
+}
+
 DATABASE_ROUTERS = ["core.db_router.TeamPerAppRouter"]
 
 
@@ -90,6 +211,29 @@ AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.NumericPasswordValidator"},
 ]
 
+# The first hasher is used for new hashes; logins transparently rehash
+# passwords stored with any other one (or an outdated work factor).
+# Set PASSWORD_HASHER=scrypt (or argon2 with argon2-cffi installed) to move
+# to a memory-hard hash.
+_PASSWORD_HASHERS = {
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "pbkdf2_sha1": "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "bcrypt_sha256": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+}
+PASSWORD_HASHER = env("PASSWORD_HASHER", default="pbkdf2")
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER),
+]
+
+# Hashing process pool (core.hashing). 0 workers hashes inline; requests
+# beyond the queue depth get 503 + Retry-After.
+PASSWORD_HASH_WORKERS = env.int("PASSWORD_HASH_WORKERS", default=0 if DEBUG else 2)
+PASSWORD_HASH_QUEUE_DEPTH = env.int("PASSWORD_HASH_QUEUE_DEPTH", default=32)
+PASSWORD_HASH_RETRY_AFTER = env.int("PASSWORD_HASH_RETRY_AFTER", default=2)
+
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
 USE_I18N = True
@@ -97,6 +241,12 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# Content-hashed names with immutable caching and gzip/brotli variants, built
+# by collectstatic; only files changed since the last run are processed.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.storage.StaticFilesStorage"},
+}
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Increase upload size limits for audio submissions
@@ -109,10 +259,117 @@ SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "http")
 AUTH_USER_MODEL = "core.User"
 
 JWT_SECRET = env("JWT_SECRET", default=SECRET_KEY)
-JWT_ALGORITHM = "HS256"
+# HS256 signs with the shared JWT_SECRET. RS256/EdDSA sign with the private
+# keys in JWT_KEYS_DIR (see core.jwt_keys) and publish the public halves at
+# /api/auth/jwks/ so gateways and team services can verify tokens locally.
+JWT_ALGORITHM = env("JWT_ALGORITHM", default="HS256")
+JWT_KEYS_DIR = Path(env("JWT_KEYS_DIR", default=str(BASE_DIR / "jwt_keys")))
+JWT_ACTIVE_KEY_ID = env("JWT_ACTIVE_KEY_ID", default="")
+# How long verifiers may cache the JWKS; `rotate_jwt_key --activate` waits
+# this long after `--stage` so none of them meets a kid it doesn't know.
+JWT_JWKS_MAX_AGE = env.int("JWT_JWKS_MAX_AGE", default=300)
+# Keep accepting HS256 tokens after switching algorithms until they expire.
+JWT_ACCEPT_HS256 = env.bool("JWT_ACCEPT_HS256", default=JWT_ALGORITHM == "HS256")
 JWT_ACCESS_TTL_SECONDS = env("JWT_ACCESS_TTL_SECONDS")
 JWT_REFRESH_TTL_SECONDS = env("JWT_REFRESH_TTL_SECONDS")
 
+# Per-process cache of token-authenticated users (see core.user_cache).
+# Size 0 disables it. Revocations reach it through JWT_REVOCATION_URL; it is
+# unused without a store, as other workers' logouts would go unseen.
+JWT_USER_CACHE_SIZE = env("JWT_USER_CACHE_SIZE")
+JWT_USER_CACHE_TTL_SECONDS = env("JWT_USER_CACHE_TTL_SECONDS")
+
+# Shared token-version epochs (core.revocation): sqlite:////path (all
+# workers on one host; the default), redis://host:6379/0 (all replicas) or
+# memory:// (one process). Logouts are enforced across the workers sharing
+# the store immediately, whatever the user cache TTL. Empty disables the
+# store, and with it the user cache, so every request checks the database.
+JWT_REVOCATION_URL = env(
+    "JWT_REVOCATION_URL", default=f"sqlite:///{Path(tempfile.gettempdir()) / 'app404-revocation.sqlite3'}"
+)
+
+# Path prefixes that never need request.user; the JWT middleware skips them.
+JWT_ANONYMOUS_PATHS = env.list("JWT_ANONYMOUS_PATHS", default=[STATIC_URL, "/api/health/"])
+
+# Minimal nginx auth_request endpoint (core.middleware.AuthSubrequestMiddleware).
+# Gateways may cache its answer for at most AUTH_SUBREQUEST_MAX_AGE seconds,
+# which is also how long a logout can take to reach them.
+AUTH_SUBREQUEST_PATH = env("AUTH_SUBREQUEST_PATH", default="/api/auth/check/")
+AUTH_SUBREQUEST_MAX_AGE = env.int("AUTH_SUBREQUEST_MAX_AGE", default=30)
+
+# Batch user lookups for team apps (core.users, POST /api/users/resolve/).
+# The API accepts staff users or callers sending X-Internal-Token.
+USER_RESOLVE_CACHE_SECONDS = env.int("USER_RESOLVE_CACHE_SECONDS", default=60)
+USER_RESOLVE_MAX_IDS = env.int("USER_RESOLVE_MAX_IDS", default=5000)
+INTERNAL_API_TOKEN = env("INTERNAL_API_TOKEN", default="")
+
+# Request timing per route, database alias and template rendering
+# (core.metrics): GET /api/metrics/ (Prometheus text; staff or
+# X-Internal-Token). Counters are per worker process and a scrape reaches
+# whichever worker accepts it, so scrape each worker (or sum by pid) rather
+# than reading one response as the whole service. The Server-Timing header
+# exposes query counts and timings to every client; turn it on for
+# debugging only.
+REQUEST_METRICS_ENABLED = env.bool("REQUEST_METRICS_ENABLED", default=True)
+SERVER_TIMING_HEADER = env.bool("SERVER_TIMING_HEADER", default=False)
+
+# On-demand cProfile/tracemalloc of single requests by staff users holding a
+# token from `manage.py profile_token` (core.profiling). Output is kept for
+# the newest PROFILING_KEEP requests. Off by default; one request per process
+# is profiled at a time.
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", default=False)
+PROFILING_DIR = Path(env("PROFILING_DIR", default=str(BASE_DIR / "profiles")))
+PROFILING_KEEP = env.int("PROFILING_KEEP", default=50)
+PROFILING_TOKEN_TTL = env.int("PROFILING_TOKEN_TTL", default=3600)
+
+# Rate limits (core.ratelimit). Views declare theirs with @rate_limit; the
+# rates below are the defaults for the ones that start expensive work.
+# RATE_LIMITS adds limits for path prefixes, e.g.
+#   {"/api/": [{"rate": "600/m", "key": "ip", "algorithm": "sliding_window"}]}
+# Counters live in RATE_LIMIT_STORE_URL: sqlite:////path (all workers on one
+# host; the default), redis://host:6379/0 (all replicas) or memory:// (per
+# process, so the effective limit is multiplied by the worker count).
+# Client addresses come from RATE_LIMIT_IP_HEADER as appended by the
+# RATE_LIMIT_PROXY_HOPS proxies in front of the app (the team gateways use
+# $proxy_add_x_forwarded_for); set it to "" when clients reach the app
+# directly, since they could then forge the header.
+RATE_LIMIT_ENABLED = env.bool("RATE_LIMIT_ENABLED", default=True)
+RATE_LIMIT_STORE_URL = env(
+    "RATE_LIMIT_STORE_URL", default=f"sqlite:///{Path(tempfile.gettempdir()) / 'app404-ratelimit.sqlite3'}"
+)
+RATE_LIMIT_IP_HEADER = env("RATE_LIMIT_IP_HEADER", default="HTTP_X_FORWARDED_FOR")
+RATE_LIMIT_PROXY_HOPS = env.int("RATE_LIMIT_PROXY_HOPS", default=1)
+RATE_LIMIT_LOGIN = env("RATE_LIMIT_LOGIN", default="10/m")
+RATE_LIMIT_LOGIN_PER_IP = env("RATE_LIMIT_LOGIN_PER_IP", default="600/m")
+RATE_LIMIT_TEAM11_SUBMIT = env("RATE_LIMIT_TEAM11_SUBMIT", default="5/m")
+RATE_LIMIT_TEAM11_SUBMIT_HOURLY = env("RATE_LIMIT_TEAM11_SUBMIT_HOURLY", default="40/h")
+RATE_LIMITS = {}
+
+# Response compression (core.middleware.CompressionMiddleware) for dynamic
+# responses; static files are pre-compressed by collectstatic.
+COMPRESSION_ENABLED = env.bool("COMPRESSION_ENABLED", default=True)
+COMPRESSION_MIN_SIZE = env.int("COMPRESSION_MIN_SIZE", default=1024)
+COMPRESSION_BROTLI_QUALITY = env.int("COMPRESSION_BROTLI_QUALITY", default=5)
+COMPRESSION_CONTENT_TYPES = env.list("COMPRESSION_CONTENT_TYPES", default=[
+    "application/json", "text/html", "text/plain", "text/css", "text/javascript",
+    "application/javascript", "image/svg+xml",
+])
+
+# JSON encoding for JsonResponse and DRF (core.fastjson): "orjson", or "json"
+# for the stdlib. Falls back to the stdlib when orjson isn't installed.
+JSON_BACKEND = env("JSON_BACKEND", default="orjson")
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.drf.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.drf.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
 JWT_COOKIE_SECURE = env.bool("JWT_COOKIE_SECURE", default=False)
 JWT_COOKIE_SAMESITE = env("JWT_COOKIE_SAMESITE", default="Lax")
 
@@ -1,10 +1,66 @@
 from functools import wraps
-from django.http import JsonResponse
 
-def api_login_required(view_func):
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponseNotAllowed
+
+from core.fastjson import JsonResponse
+
+
+def _guard(view_func, check):
+    """
+    Wrap a view so `check(request)` runs first and may short-circuit with a
+    response. Async views stay coroutine functions; Django 4.2's own view
+    decorators don't preserve that, so the view would be run in a thread.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async(request, *args, **kwargs):
+            return check(request) or await view_func(request, *args, **kwargs)
+        return _wrapped_async
+
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return JsonResponse({"detail": "Authentication required"}, status=401)
-        return view_func(request, *args, **kwargs)
+        return check(request) or view_func(request, *args, **kwargs)
     return _wrapped
+
+
+def _authentication_required(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"detail": "Authentication required"}, status=401)
+    return None
+
+
+def api_login_required(view_func):
+    if not iscoroutinefunction(view_func):
+        return _guard(view_func, _authentication_required)
+
+    @wraps(view_func)
+    async def _wrapped_async(request, *args, **kwargs):
+        if hasattr(request, "auser"):
+            # Resolve the user without evaluating the lazy request.user here.
+            request.user = await request.auser()
+        return _authentication_required(request) or await view_func(request, *args, **kwargs)
+    return _wrapped_async
+
+
+def require_http_methods(request_method_list):
+    """django.views.decorators.http.require_http_methods that also keeps async views async."""
+    def _allowed(request):
+        if request.method not in request_method_list:
+            return HttpResponseNotAllowed(request_method_list)
+        return None
+
+    def decorator(view_func):
+        return _guard(view_func, _allowed)
+    return decorator
+
+
+require_POST = require_http_methods(["POST"])
+require_POST.__doc__ = "django.views.decorators.http.require_POST that also keeps async views async."
+
+
+def csrf_exempt(view_func):
+    """django.views.decorators.csrf.csrf_exempt that also keeps async views async."""
+    wrapped = _guard(view_func, lambda request: None)
+    wrapped.csrf_exempt = True
+    return wrapped
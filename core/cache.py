@@ -0,0 +1,61 @@
+"""
+Whole-page caching for template views whose output only changes on deploy.
+
+Django's cache_page varies on the full Cookie header, which is unique per
+logged-in client and so never hits. cache_page_per_user() keys on what the
+page actually depends on instead: the path, the query string and either the
+authentication state (default) or the user id (per_user=True), plus
+PAGE_CACHE_VERSION so a deploy starts from a fresh cache.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+
+def _page_key(request, per_user):
+    if per_user:
+        who = str(request.user.pk) if request.user.is_authenticated else "anon"
+    else:
+        who = "auth" if request.user.is_authenticated else "anon"
+    url = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+    return f"page:{settings.PAGE_CACHE_VERSION}:{who}:{url}"
+
+
+def _shareable(request, response):
+    # Cookies set by the view itself are per client. The CSRF cookie is only
+    # added later by CsrfViewMiddleware.process_response, so a page that
+    # rendered {% csrf_token %} is recognised by the flag get_token() leaves
+    # in request.META instead: caching it would hand one client's token to
+    # everyone.
+    if response.cookies:
+        return False
+    return not (request.META.get("CSRF_COOKIE_NEEDS_UPDATE") or request.META.get("CSRF_COOKIE_USED"))
+
+
+def cache_page_per_user(timeout=None, per_user=False):
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view_func(request, *args, **kwargs)
+
+            key = _page_key(request, per_user)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Page-Cache"] = "hit"
+            else:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming and _shareable(request, response):
+                    ttl = settings.PAGE_CACHE_SECONDS if timeout is None else timeout
+                    cache.set(key, (response.content, response["Content-Type"]), ttl)
+                    response["X-Page-Cache"] = "miss"
+            patch_vary_headers(response, ["Cookie", "Authorization"])
+            return response
+        return _wrapped
+    return decorator
@@ -0,0 +1,87 @@
+"""
+Conditional GET: ETag/Last-Modified validators and 304 responses.
+
+Read endpoints compute validators from what they load anyway (row ids and
+updated_at timestamps), before building the body, so a client revalidating
+an unchanged resource gets 304 Not Modified without the serialisation or
+template rendering:
+
+    etag = conditional.etag_for(lesson.pk, lesson.updated_at)
+    return conditional.not_modified(request, etag) or conditional.with_validators(render(...), etag)
+
+@conditional(etag_func=...) does the same for views whose validators only
+need the request (Django 4.2's condition() would turn an async view sync).
+Responses get `Cache-Control: private, no-cache` unless they set their
+own: browsers keep a copy and always revalidate it, shared caches don't
+store per-user data.
+"""
+import datetime
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def etag_for(*parts) -> str:
+    """A quoted ETag for values whose repr changes whenever the resource does."""
+    return quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def _timestamp(last_modified):
+    if last_modified is None:
+        return None
+    if timezone.is_naive(last_modified):
+        last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+    return int(last_modified.timestamp())
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """The 304 (or 412) response the request's preconditions call for, or None."""
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    return None if response is None else with_validators(response, etag, last_modified, request)
+
+
+def with_validators(response, etag=None, last_modified=None, request=None):
+    if request is not None and request.method not in ("GET", "HEAD"):
+        return response
+    if response.status_code >= 300 and response.status_code != 304:
+        return response
+    if etag is not None:
+        response.headers.setdefault("ETag", etag)
+    if last_modified is not None and not response.has_header("Last-Modified"):
+        response.headers["Last-Modified"] = http_date(_timestamp(last_modified))
+    response.headers.setdefault("Cache-Control", "private, no-cache")
+    return response
+
+
+def conditional(etag_func=None, last_modified_func=None):
+    """
+    Like django.views.decorators.http.condition(), keeping async views async.
+    The functions take the view's arguments and must not query the database.
+    """
+    def validators(request, args, kwargs):
+        etag = etag_func(request, *args, **kwargs) if etag_func else None
+        last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+        return etag, last_modified
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async(request, *args, **kwargs):
+                etag, last_modified = validators(request, args, kwargs)
+                return not_modified(request, etag, last_modified) or with_validators(
+                    await view_func(request, *args, **kwargs), etag, last_modified, request
+                )
+            return _wrapped_async
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            etag, last_modified = validators(request, args, kwargs)
+            return not_modified(request, etag, last_modified) or with_validators(
+                view_func(request, *args, **kwargs), etag, last_modified, request
+            )
+        return _wrapped
+    return decorator
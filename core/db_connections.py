@@ -0,0 +1,84 @@
+"""
+Reuse accounting and idle eviction for persistent database connections.
+
+Django keeps a connection per alias and thread for CONN_MAX_AGE seconds
+(checked with CONN_HEALTH_CHECKS before reuse). That only pays off with
+sync workers: under ASGI, threads come and go with requests and their
+connections are left open, so DB_CONN_MAX_AGE defaults to 0 there. Two
+things are added here:
+
+- connections that served no query for DB_CONN_MAX_IDLE seconds, e.g. a
+  team database a worker touched once, are closed when a request on their
+  thread finishes instead of lingering until max age;
+- per-process counters of connections opened vs requests that reused an
+  existing connection, per alias, served by the /api/db/connections/ view.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {"opened": 0, "reused": 0, "closed_idle": 0})
+_local = threading.local()
+
+
+def _count(alias, key):
+    with _lock:
+        _stats[alias][key] += 1
+
+
+def _touch(execute, sql, params, many, context):
+    context["connection"]._last_used_at = time.monotonic()
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid="core.db_connections.opened")
+def connection_opened(sender, connection, **kwargs):
+    connection._opened_at = connection._last_used_at = time.monotonic()
+    if _touch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_touch)
+    _count(connection.alias, "opened")
+
+
+@receiver(request_started, dispatch_uid="core.db_connections.began")
+def request_began(**kwargs):
+    _local.started_at = time.monotonic()
+
+
+@receiver(request_finished, dispatch_uid="core.db_connections.ended")
+def request_ended(**kwargs):
+    started_at = getattr(_local, "started_at", None)
+    if started_at is None:
+        return
+    now = time.monotonic()
+    for conn in connections.all(initialized_only=True):
+        last_used = getattr(conn, "_last_used_at", None)
+        if last_used is None:
+            continue
+        if last_used >= started_at:
+            if conn._opened_at < started_at:
+                _count(conn.alias, "reused")
+        elif (
+            conn.connection is not None
+            and not conn.in_atomic_block
+            and now - last_used > settings.DB_CONN_MAX_IDLE
+        ):
+            conn.close()
+            _count(conn.alias, "closed_idle")
+
+
+def stats() -> dict:
+    with _lock:
+        result = {alias: dict(counts) for alias, counts in _stats.items()}
+    for alias, counts in result.items():
+        served = counts["opened"] + counts["reused"]
+        counts["reuse_ratio"] = round(counts["reused"] / served, 3) if served else 0.0
+        counts["conn_max_age"] = settings.DATABASES[alias].get("CONN_MAX_AGE")
+    return result
+
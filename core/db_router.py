@@ -1,17 +1,105 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.conf import settings
 
+
+class _Pins:
+    __slots__ = ("sticky", "written")
+
+    def __init__(self, sticky=()):
+        self.sticky = frozenset(sticky)
+        self.written = set()
+
+    def __contains__(self, alias):
+        return alias in self.written or alias in self.sticky
+
+
+# Team aliases whose reads must go to the primary in the current request:
+# written during it, or pinned by ReplicaPinMiddleware's cookie. None outside
+# a request; then the first write pins the context (thread) until it ends, so
+# background tasks and management commands should run in scope().
+_pins = ContextVar("core_db_router_pins", default=None)
+
+
+def begin_request(sticky=()):
+    return _pins.set(_Pins(sticky))
+
+
+def end_request(token):
+    """Reset the request scope; returns the aliases written during it."""
+    written = _pins.get().written
+    _pins.reset(token)
+    return written
+
+
+@contextmanager
+def scope(sticky=()):
+    """
+    A request-like pinning scope for work outside requests, as a context
+    manager or decorator: background tasks, or each item of a management
+    command's loop. Reads of the `sticky` aliases go to the primary from the
+    start, e.g. for rows the request that queued the task just wrote.
+    """
+    token = begin_request(sticky)
+    try:
+        yield
+    finally:
+        end_request(token)
+
+
 class TeamPerAppRouter:
+    """
+    Team apps live in the alias named after them. Teams with replicas
+    (settings.DATABASE_REPLICAS) read from a random replica unless the
+    request has written to that team, or did so within
+    DB_REPLICA_PIN_SECONDS (see core.middleware.ReplicaPinMiddleware).
+    """
+
+    def __init__(self):
+        self.team_apps = frozenset(settings.TEAM_APPS)
+        self.replicas = {team: tuple(aliases) for team, aliases in settings.DATABASE_REPLICAS.items() if aliases}
+        self.primary_of = {alias: team for team, aliases in self.replicas.items() for alias in aliases}
+        # DatabaseCache entries (app label "django_cache") for CACHE_URL=sqlitecache://.
+        self.cache_alias = "cache" if "cache" in settings.DATABASES else None
+
     def db_for_read(self, model, **hints):
-        if model._meta.app_label in settings.TEAM_APPS:
-            return model._meta.app_label
-        return None
+        label = model._meta.app_label
+        if label not in self.team_apps:
+            return self.cache_alias if label == "django_cache" else None
+        replicas = self.replicas.get(label)
+        if replicas:
+            pins = _pins.get()
+            if pins is None or label not in pins:
+                return random.choice(replicas)
+        return label
 
     def db_for_write(self, model, **hints):
-        if model._meta.app_label in settings.TEAM_APPS:
-            return model._meta.app_label
+        label = model._meta.app_label
+        if label not in self.team_apps:
+            return self.cache_alias if label == "django_cache" else None
+        if label in self.replicas:
+            pins = _pins.get()
+            if pins is None:
+                pins = _Pins()
+                _pins.set(pins)
+            pins.written.add(label)
+        return label
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # An object read from a replica may relate to one from its primary.
+        db1 = self.primary_of.get(obj1._state.db, obj1._state.db)
+        db2 = self.primary_of.get(obj2._state.db, obj2._state.db)
+        if db1 in self.team_apps or db2 in self.team_apps:
+            return db1 == db2
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
-        if app_label in settings.TEAM_APPS:
+        if db in self.primary_of:
+            return False
+        if app_label == "django_cache" and self.cache_alias:
+            return db == self.cache_alias
+        if app_label in self.team_apps:
             return db == app_label
         return db == "default"
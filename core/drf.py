@@ -0,0 +1,41 @@
+"""
+DRF renderer and parser backed by core.fastjson, for REST_FRAMEWORK's
+DEFAULT_RENDERER_CLASSES and DEFAULT_PARSER_CLASSES.
+
+Compact responses are encoded by orjson; indented ones (the browsable API,
+`Accept: application/json; indent=4`) and settings orjson can't honour
+(UNICODE_JSON=False, COMPACT_JSON=False) go through DRF's own renderer.
+Unlike json with STRICT_JSON, orjson writes NaN and infinities as null
+instead of failing.
+"""
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+
+from core import fastjson
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (fastjson.backend() != "orjson" or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = fastjson.dumps(data, encoder=self.encoder_class)
+        # Keep DRF's guarantee that the output is also valid JavaScript.
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class JSONParser(parsers.JSONParser):
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if fastjson.backend() != "orjson" or parsers.get_encoding(parser_context or {}).lower() not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return fastjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,72 @@
+"""
+JSON encoding and decoding through orjson, with the stdlib json module as
+fallback.
+
+orjson serialises dicts of plain values several times faster than json and
+produces bytes, which is what responses need anyway. It is used when
+installed and JSON_BACKEND is "orjson" (the default); JSON_BACKEND=json or a
+missing package means the stdlib, with identical output apart from
+whitespace and non-ASCII characters being sent as UTF-8 rather than \\u
+escapes.
+
+    from core.fastjson import JsonResponse, loads
+
+    data = loads(request.body)    # raises ValueError on bad input
+    return JsonResponse(data)
+
+Dates, times, decimals, lazy strings and the like still go through
+DjangoJSONEncoder, so they come out exactly as with django.http.JsonResponse.
+core.drf has the matching DRF renderer and parser.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse as DjangoJsonResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError  # orjson.JSONDecodeError subclasses it
+
+# Datetimes go to the encoder so they are formatted the way Django formats them.
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def backend() -> str:
+    """The library dumps() and loads() use with the current settings: "orjson" or "json"."""
+    return "orjson" if orjson is not None and settings.JSON_BACKEND == "orjson" else "json"
+
+
+def dumps(obj, encoder=DjangoJSONEncoder) -> bytes:
+    """Compact UTF-8 JSON; types JSON lacks are converted by `encoder`."""
+    if backend() == "orjson":
+        try:
+            return orjson.dumps(obj, default=encoder().default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, circular data: let json decide or report.
+            pass
+    return json.dumps(obj, cls=encoder, separators=(",", ":")).encode()
+
+
+def loads(data):
+    """Parse str or bytes (such as request.body)."""
+    if backend() == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JsonResponse(DjangoJsonResponse):
+    """django.http.JsonResponse, encoding with dumps() unless json_dumps_params are given."""
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if json_dumps_params is not None:
+            super().__init__(data, encoder, safe, json_dumps_params, **kwargs)
+            return
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        # Skip DjangoJsonResponse.__init__, which would encode with json.dumps.
+        super(DjangoJsonResponse, self).__init__(content=dumps(data, encoder), **kwargs)
@@ -0,0 +1,74 @@
+"""
+WSGI/ASGI handlers with per-URL-prefix middleware profiles.
+
+settings.MIDDLEWARE stays the full chain for HTML pages. Each entry of
+settings.MIDDLEWARE_PROFILES lists path PREFIXES and a leaner MIDDLEWARE
+chain for them, e.g. JSON APIs that authenticate purely via JWT and never
+need sessions, CSRF cookies or messages. The first matching profile wins.
+"""
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+
+@contextmanager
+def _middleware_setting(middleware):
+    # BaseHandler.load_middleware() reads settings.MIDDLEWARE directly. This
+    # only runs while handlers are built at startup, before any request.
+    original = settings.MIDDLEWARE
+    settings.MIDDLEWARE = middleware
+    try:
+        yield
+    finally:
+        settings.MIDDLEWARE = original
+
+
+class ProfiledHandlerMixin:
+    def load_middleware(self, is_async=False):
+        super().load_middleware(is_async)
+        self._profiles = []
+        for profile in settings.MIDDLEWARE_PROFILES.values():
+            chain = BaseHandler()
+            with _middleware_setting(profile["MIDDLEWARE"]):
+                chain.load_middleware(is_async)
+            self._profiles.append((tuple(profile["PREFIXES"]), chain))
+
+    def chain_for(self, path):
+        for prefixes, chain in self._profiles:
+            if path.startswith(prefixes):
+                return chain
+        return None
+
+    def get_response(self, request):
+        chain = self.chain_for(request.path_info)
+        if chain is None:
+            return super().get_response(request)
+        return chain.get_response(request)
+
+    async def get_response_async(self, request):
+        chain = self.chain_for(request.path_info)
+        if chain is None:
+            return await super().get_response_async(request)
+        return await chain.get_response_async(request)
+
+
+class ProfiledWSGIHandler(ProfiledHandlerMixin, WSGIHandler):
+    pass
+
+
+class ProfiledASGIHandler(ProfiledHandlerMixin, ASGIHandler):
+    pass
+
+
+def get_wsgi_application():
+    django.setup(set_prefix=False)
+    return ProfiledWSGIHandler()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ProfiledASGIHandler()
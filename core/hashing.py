@@ -0,0 +1,219 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2/scrypt checks are CPU-bound and a login burst would otherwise pin
+every gunicorn worker. Hashing runs on a small process pool
+(PASSWORD_HASH_WORKERS, 0 = inline) and at most PASSWORD_HASH_QUEUE_DEPTH
+jobs may wait for it; beyond that callers get HashingBusy and should answer
+503 with Retry-After instead of queueing indefinitely.
+
+The limits are per worker process. Only the async functions (ahash_password,
+aauthenticate) let a worker keep serving while its jobs run, so that a burst
+fills the queue and gets shed; the sync ones block their thread until the
+pool answers and are meant for management commands and the shell. Views
+that hash are async for that reason.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full; retry after settings.PASSWORD_HASH_RETRY_AFTER seconds."""
+
+
+def _init_worker():
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app404.settings")
+    django.setup()
+
+
+# Pool tasks return (result, started_at, seconds_spent_hashing).
+
+def _make(password):
+    started = time.time()
+    encoded = make_password(password)
+    return encoded, started, time.time() - started
+
+
+def _check(password, encoded):
+    started = time.time()
+    upgraded = []
+    valid = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return (valid, upgraded[0] if upgraded else None), started, time.time() - started
+
+
+class HashingExecutor:
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "hash_seconds_total": 0.0,
+            "queue_wait_seconds_total": 0.0,
+        }
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = new_pool(self.workers)
+            return self._pool
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning("Password hashing queue full; shedding request")
+            raise HashingBusy()
+        with self._lock:
+            self._stats["in_flight"] += 1
+
+    def _release(self):
+        self._slots.release()
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    def _record(self, submitted, started, spent):
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["hash_seconds_total"] += spent
+            self._stats["queue_wait_seconds_total"] += max(0.0, started - submitted)
+
+    def run(self, fn, *args):
+        """Run `fn` on the pool, blocking the calling thread; see arun() for views."""
+        self._acquire()
+        submitted = time.time()
+        try:
+            if self.workers > 0:
+                result, started, spent = self._get_pool().submit(fn, *args).result()
+            else:
+                result, started, spent = fn(*args)
+        finally:
+            self._release()
+        self._record(submitted, started, spent)
+        return result
+
+    async def arun(self, fn, *args):
+        """Like run(), but awaits the pool (or a thread when inline) instead of blocking."""
+        self._acquire()
+        submitted = time.time()
+        try:
+            if self.workers > 0:
+                future = self._get_pool().submit(fn, *args)
+                result, started, spent = await asyncio.wrap_future(future)
+            else:
+                result, started, spent = await sync_to_async(fn, thread_sensitive=False)(*args)
+        finally:
+            self._release()
+        self._record(submitted, started, spent)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+executor = HashingExecutor(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_depth=settings.PASSWORD_HASH_QUEUE_DEPTH,
+)
+
+
+def hash_password(password: str) -> str:
+    return executor.run(_make, password)
+
+
+async def ahash_password(password: str) -> str:
+    return await executor.arun(_make, password)
+
+
+def new_pool(workers: int) -> ProcessPoolExecutor:
+    """A spawn-based process pool whose workers have Django set up."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def hash_many(passwords, pool=None, workers: int = 1) -> list:
+    """Hash a list of passwords, spread over `pool` when one is given."""
+    if pool is None:
+        return [_make(p)[0] for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return [encoded for encoded, _, _ in pool.map(_make, passwords, chunksize=chunksize)]
+
+
+# A string: pool workers import this module before Django is set up.
+MODEL_BACKEND = "django.contrib.auth.backends.ModelBackend"
+
+
+def _password_login_enabled():
+    return MODEL_BACKEND in settings.AUTHENTICATION_BACKENDS
+
+
+def authenticate(email: str, password: str):
+    """
+    Email/password counterpart of django.contrib.auth.authenticate() that hashes
+    on the executor. Upgrades the stored hash when PASSWORD_HASHERS prefers a
+    different algorithm or work factor. Raises HashingBusy when overloaded.
+
+    This does ModelBackend's job only: other AUTHENTICATION_BACKENDS are not
+    consulted, and without ModelBackend in the list nobody is authenticated.
+    Returned users carry `backend` like authenticate() sets it.
+    """
+    if not _password_login_enabled():
+        return None
+    User = get_user_model()
+    user = User._default_manager.filter(**{User.USERNAME_FIELD: email}).first()
+    if user is None:
+        # Same cost as a real check, so response time doesn't reveal unknown emails.
+        hash_password(password)
+        return None
+
+    valid, upgraded = executor.run(_check, password, user.password)
+    if not valid or not user.is_active:
+        return None
+
+    if upgraded:
+        user.password = upgraded
+        user.save(update_fields=["password"])
+    user.backend = MODEL_BACKEND
+    return user
+
+
+async def aauthenticate(email: str, password: str):
+    """Async version of authenticate(), using the async ORM."""
+    if not _password_login_enabled():
+        return None
+    User = get_user_model()
+    user = await User._default_manager.filter(**{User.USERNAME_FIELD: email}).afirst()
+    if user is None:
+        await ahash_password(password)
+        return None
+
+    valid, upgraded = await executor.arun(_check, password, user.password)
+    if not valid or not user.is_active:
+        return None
+
+    if upgraded:
+        user.password = upgraded
+        await user.asave(update_fields=["password"])
+    user.backend = MODEL_BACKEND
+    return user
@@ -0,0 +1,146 @@
+"""
+Asymmetric JWT signing keys.
+
+Keys live in settings.JWT_KEYS_DIR, one PEM file per key id (kid):
+
+    <kid>.pem       private key, may sign and verify
+    <kid>.next.pem  staged key: published, but doesn't sign yet
+    <kid>.pub.pem   retired key, public part only (verify until tokens expire)
+
+The active signing key is settings.JWT_ACTIVE_KEY_ID, or the greatest kid
+among private keys (`manage.py rotate_jwt_key` names keys by UTC timestamp,
+so that is the newest one). The public halves are published as a JWKS
+document so gateways and team services can verify tokens locally. Those
+cache it for up to JWT_JWKS_MAX_AGE seconds, which is why a new key is
+staged first and only activated once every cached copy includes it.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "EdDSA")
+
+PRIVATE_SUFFIX = ".pem"
+PUBLIC_SUFFIX = ".pub.pem"
+STAGED_SUFFIX = ".next.pem"
+KID_FORMAT = "%Y%m%d%H%M%S"
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    public_key: object
+    private_key: object = None
+    staged: bool = False
+
+    def to_jwk(self) -> dict:
+        converter = RSAAlgorithm if self.algorithm == "RS256" else OKPAlgorithm
+        jwk = converter.to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+def _algorithm_for(public_key) -> str:
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return "RS256"
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return "EdDSA"
+    raise ImproperlyConfigured(f"Unsupported JWT key type: {type(public_key).__name__}")
+
+
+def generate_private_key(algorithm: str):
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ImproperlyConfigured(f"JWT_ALGORITHM must be one of {ASYMMETRIC_ALGORITHMS} to generate keys")
+
+
+def private_key_pem(private_key) -> bytes:
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def public_key_pem(public_key) -> bytes:
+    return public_key.public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
+
+class KeySet:
+    def __init__(self, keys, active_kid=None):
+        self.keys = {k.kid: k for k in keys}
+        signers = sorted(k.kid for k in keys if k.private_key is not None and not k.staged)
+        self.active_kid = active_kid or (signers[-1] if signers else None)
+
+    @classmethod
+    def load(cls, directory, active_kid=None):
+        keys = []
+        directory = Path(directory)
+        if directory.is_dir():
+            for path in sorted(directory.glob(f"*{PRIVATE_SUFFIX}")):
+                data = path.read_bytes()
+                staged = path.name.endswith(STAGED_SUFFIX)
+                if path.name.endswith(PUBLIC_SUFFIX):
+                    kid = path.name[: -len(PUBLIC_SUFFIX)]
+                    public_key = serialization.load_pem_public_key(data)
+                    private_key = None
+                else:
+                    kid = path.name[: -len(STAGED_SUFFIX if staged else PRIVATE_SUFFIX)]
+                    private_key = serialization.load_pem_private_key(data, password=None)
+                    public_key = private_key.public_key()
+                keys.append(SigningKey(kid, _algorithm_for(public_key), public_key, private_key, staged))
+        return cls(keys, active_kid=active_kid)
+
+    def get(self, kid):
+        return self.keys.get(kid)
+
+    @property
+    def signing_key(self) -> SigningKey:
+        key = self.keys.get(self.active_kid)
+        if key is None or key.private_key is None or key.staged:
+            raise ImproperlyConfigured(
+                f"No private JWT signing key found in {settings.JWT_KEYS_DIR}; "
+                "run `python manage.py rotate_jwt_key`."
+            )
+        return key
+
+    def jwks(self) -> dict:
+        return {"keys": [self.keys[kid].to_jwk() for kid in sorted(self.keys)]}
+
+
+_lock = threading.Lock()
+_cached = (None, None)  # (fingerprint, KeySet)
+
+
+def get_key_set() -> KeySet:
+    """
+    Return the KeySet for JWT_KEYS_DIR, reloading it when the directory
+    changes so a rotation is picked up without restarting workers.
+    """
+    global _cached
+    directory = str(settings.JWT_KEYS_DIR)
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    fingerprint = (directory, mtime, settings.JWT_ACTIVE_KEY_ID)
+
+    if _cached[0] == fingerprint:
+        return _cached[1]
+    with _lock:
+        if _cached[0] != fingerprint:
+            _cached = (fingerprint, KeySet.load(directory, active_kid=settings.JWT_ACTIVE_KEY_ID or None))
+        return _cached[1]
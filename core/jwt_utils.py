@@ -2,11 +2,21 @@ import time
 import jwt
 from django.conf import settings
 
+from core.jwt_keys import get_key_set
+
 
 def _now() -> int:
     return int(time.time())
 
 
+def _encode(payload: dict) -> str:
+    if settings.JWT_ALGORITHM == "HS256":
+        return jwt.encode(payload, settings.JWT_SECRET, algorithm="HS256")
+
+    key = get_key_set().signing_key
+    return jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
 def create_access_token(user) -> str:
     payload = {
         "type": "access",
@@ -16,7 +26,7 @@ def create_access_token(user) -> str:
         "iat": _now(),
         "exp": _now() + settings.JWT_ACCESS_TTL_SECONDS,
     }
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    return _encode(payload)
 
 
 def create_refresh_token(user) -> str:
@@ -27,8 +37,18 @@ def create_refresh_token(user) -> str:
         "iat": _now(),
         "exp": _now() + settings.JWT_REFRESH_TTL_SECONDS,
     }
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    return _encode(payload)
 
 
 def decode_token(token: str) -> dict:
-    return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is None:
+        # HS256 tokens carry no kid; only accepted while the shared secret is trusted.
+        if not settings.JWT_ACCEPT_HS256:
+            raise jwt.InvalidTokenError("HS256 tokens are not accepted")
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
+
+    key = get_key_set().get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown key id: {kid}")
+    return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
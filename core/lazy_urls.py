@@ -0,0 +1,67 @@
+"""
+URLconfs that are imported on the first request under their prefix.
+
+include() imports the URLconf (and with it views, serializers and service
+clients) when app404.urls loads, and system checks plus the first reverse()
+walk every URLconf. With settings.LAZY_TEAM_URLS each team is mounted with
+lazy_include() instead:
+
+- resolving a path outside the prefix never imports the team's URLconf;
+- system checks skip URLconfs that haven't loaded yet (`manage.py migrate`
+  runs the URL checks), so `manage.py check` with the setting off is the
+  place to validate them;
+- reverse() only knows a team's URL names once that team has been loaded.
+  Loading one clears the URL caches so its names become reversible.
+"""
+from importlib import import_module
+
+from django.urls import clear_url_caches
+from django.urls.resolvers import RoutePattern, URLResolver
+from django.utils.datastructures import MultiValueDict
+from django.utils.functional import cached_property
+
+
+class LazyURLResolver(URLResolver):
+    @property
+    def loaded(self):
+        return "urlconf_module" in self.__dict__
+
+    @cached_property
+    def urlconf_module(self):
+        module = import_module(self.urlconf_name)
+        # The root resolver was populated without this URLconf's names;
+        # rebuild it on the next reverse().
+        clear_url_caches()
+        return module
+
+    def _populate(self):
+        if self.loaded:
+            super()._populate()
+
+    @property
+    def reverse_dict(self):
+        return super().reverse_dict if self.loaded else MultiValueDict()
+
+    @property
+    def namespace_dict(self):
+        return super().namespace_dict if self.loaded else {}
+
+    @property
+    def app_dict(self):
+        return super().app_dict if self.loaded else {}
+
+    def check(self):
+        if not self.loaded:
+            return self.pattern.check()
+        return super().check()
+
+
+def lazy_include(route, urlconf_name, app_name=None, namespace=None):
+    """path(route, include(urlconf_name)), importing urlconf_name on first use."""
+    return LazyURLResolver(
+        RoutePattern(route, is_endpoint=False),
+        urlconf_name,
+        app_name=app_name,
+        namespace=namespace,
+    )
+
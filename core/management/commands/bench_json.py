@@ -0,0 +1,87 @@
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse as DjangoJsonResponse
+from django.utils import timezone
+
+from core import fastjson
+from core.fastjson import JsonResponse
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare stdlib json with core.fastjson on team9 lesson list payloads: DRF rendering, "
+        "JsonResponse and parsing, in-process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lessons", type=int, default=20)
+        parser.add_argument("--words", type=int, default=30, help="Words per synthetic lesson.")
+        parser.add_argument("-n", "--repeat", type=int, default=200)
+        parser.add_argument("--from-db", action="store_true",
+                            help="Serialize the newest --lessons lessons from the team9 database instead.")
+
+    def handle(self, *args, **options):
+        try:
+            from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+            from core.drf import JSONRenderer
+            from team9.models import Lesson
+            from team9.serializers import LessonSerializer
+        except (ImportError, RuntimeError) as exc:
+            raise CommandError(f"team9 and rest_framework must be installed: {exc}")
+
+        if options["from_db"]:
+            lessons = list(Lesson.objects.prefetch_related("words").order_by("-created_at")[:options["lessons"]])
+        else:
+            lessons = _synthetic_lessons(options["lessons"], options["words"])
+        data = LessonSerializer(lessons, many=True).data
+        body = DRFJSONRenderer().render(data)
+
+        n = options["repeat"]
+        rows = [
+            ("DRF render", lambda: DRFJSONRenderer().render(data), lambda: JSONRenderer().render(data)),
+            ("JsonResponse", lambda: DjangoJsonResponse(data, safe=False), lambda: JsonResponse(data, safe=False)),
+            ("parse body", lambda: json.loads(body), lambda: fastjson.loads(body)),
+        ]
+        self.stdout.write(
+            f"{len(lessons)} lessons, {sum(len(lesson.words.all()) for lesson in lessons)} words, "
+            f"{len(body) / 1024:.1f} KiB, {n} runs, fast backend: {fastjson.backend()}"
+        )
+        for label, stdlib, fast in rows:
+            slow_us, fast_us = _time(stdlib, n), _time(fast, n)
+            self.stdout.write(self.style.SUCCESS(
+                f"  {label:<13} json {slow_us:9.1f} us   fast {fast_us:9.1f} us   x{slow_us / fast_us:.1f}"
+            ))
+
+
+def _time(fn, n):
+    fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def _synthetic_lessons(count, words_per_lesson):
+    """Unsaved lessons with their words preloaded, shaped like real team9 rows."""
+    from team9.models import Lesson, Word
+
+    now = timezone.now()
+    lessons = []
+    for i in range(1, count + 1):
+        lesson = Lesson(id=i, user_id=i % 7 + 1, title=f"Lesson {i}: everyday vocabulary",
+                        description="واژه‌های پرکاربرد روزمره برای مرور روزانه " * 3, created_at=now)
+        words = [
+            Word(id=i * 1000 + j, lesson=lesson, term=f"word{j}", definition="معنی فارسی این واژه همراه با یک مثال",
+                 current_day=j % 9, review_history="11010000"[: j % 9].ljust(8, "0"), is_learned=j % 9 == 8,
+                 last_review_date=date.today() - timedelta(days=1), next_review_date=date.today() + timedelta(days=j % 5))
+            for j in range(words_per_lesson)
+        ]
+        # What prefetch_related("words") leaves behind, so no queries run.
+        prefetched = Word.objects.all()
+        prefetched._result_cache, prefetched._prefetch_done = words, True
+        lesson._prefetched_objects_cache = {"words": prefetched}
+        lessons.append(lesson)
+    return lessons
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.handlers import ProfiledHandlerMixin, ProfiledWSGIHandler
+from core.jwt_utils import create_access_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request cost of the full MIDDLEWARE chain with the matching "
+        "MIDDLEWARE_PROFILES chain for a path, in-process (no network or server)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="/api/health/")
+        parser.add_argument("-n", "--requests", type=int, default=2000)
+        parser.add_argument("--email", help="Send an access token for this user.")
+
+    def handle(self, *args, **options):
+        handler = ProfiledWSGIHandler()
+        path = options["path"]
+        profile_chain = handler.chain_for(path)
+        if profile_chain is None:
+            self.stderr.write(f"No middleware profile matches {path}; nothing to compare.")
+            return
+
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ("*", "") and not h.startswith(".")), "localhost")
+        factory = RequestFactory(HTTP_HOST=host)
+        cookies = {"sessionid": "benchmark-missing-session"}
+        if options["email"]:
+            from django.contrib.auth import get_user_model
+
+            user = get_user_model().objects.get(email=options["email"])
+            cookies["access_token"] = create_access_token(user)
+
+        def run(get_response):
+            n = options["requests"]
+            with CaptureQueriesContext(connections["default"]) as queries:
+                start = time.perf_counter()
+                for _ in range(n):
+                    request = factory.get(path)
+                    request.COOKIES.update(cookies)
+                    get_response(request).close()
+                elapsed = time.perf_counter() - start
+            return elapsed / n * 1e6, len(queries) / n
+
+        # Skip ProfiledHandlerMixin's dispatch to force the full MIDDLEWARE chain.
+        full = run(lambda request: super(ProfiledHandlerMixin, handler).get_response(request))
+        lean = run(profile_chain.get_response)
+
+        self.stdout.write(f"{path}, {options['requests']} requests, {len(settings.MIDDLEWARE)} vs profile middleware")
+        self.stdout.write(f"  full chain:    {full[0]:8.1f} us/request, {full[1]:.2f} queries/request")
+        self.stdout.write(f"  profile chain: {lean[0]:8.1f} us/request, {lean[1]:.2f} queries/request")
+        self.stdout.write(self.style.SUCCESS(
+            f"  saved:         {full[0] - lean[0]:8.1f} us/request ({(1 - lean[0] / full[0]) * 100:.0f}%), "
+            f"{full[1] - lean[1]:.2f} queries/request"
+        ))
@@ -0,0 +1,200 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import connections, transaction
+from django.db.models import F
+
+from core import hashing
+from core.revocation import get_store, user_epoch
+from core.user_cache import user_cache
+from core.users import forget_user
+
+User = get_user_model()
+
+PROFILE_FIELDS = ["first_name", "last_name", "age"]
+UPDATE_FIELDS = ["password", *PROFILE_FIELDS]
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create users from a CSV or JSONL file (columns/keys: email, password, "
+        "first_name, last_name, age). Passwords are hashed on a process pool and rows "
+        "are inserted with bulk_create in batches. Updated users whose row has a password "
+        "get it, and their existing tokens are revoked; rows without one keep the old password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, or - for stdin.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                            help="Defaults to the file extension (csv otherwise).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Hashing processes; 0 hashes in this process.")
+        parser.add_argument("--on-conflict", choices=["skip", "update"], default="skip",
+                            help="What to do with emails that already exist.")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("jsonl" if options["path"].endswith((".jsonl", ".ndjson")) else "csv")
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        self.database = options["database"]
+        self.update = options["on_conflict"] == "update"
+        self.counts = {"created": 0, "updated": 0, "skipped": 0, "invalid": 0}
+        self.seen = set()
+
+        started = time.perf_counter()
+        stream = sys.stdin if options["path"] == "-" else open(options["path"], newline="", encoding="utf-8")
+        pool = hashing.new_pool(options["workers"]) if options["workers"] > 0 else None
+        try:
+            rows = self._read(stream, fmt)
+            while batch := list(islice(rows, batch_size)):
+                self._import_batch(batch, pool, options["workers"])
+                self._report(started)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        self._report(started, final=True)
+
+    def _read(self, stream, fmt):
+        if fmt == "csv":
+            for lineno, row in enumerate(csv.DictReader(stream), start=2):
+                yield lineno, row
+            return
+        for lineno, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield lineno, json.loads(line)
+            except json.JSONDecodeError:
+                self.stderr.write(f"line {lineno}: invalid JSON")
+                self.counts["invalid"] += 1
+
+    def _clean(self, lineno, row):
+        if not isinstance(row, dict):
+            self.stderr.write(f"line {lineno}: expected an object")
+            return None
+        for field in ("email", "password", "first_name", "last_name"):
+            if not isinstance(row.get(field) or "", str):
+                self.stderr.write(f"line {lineno}: {field} must be a string")
+                return None
+        email = (row.get("email") or "").strip().lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            self.stderr.write(f"line {lineno}: invalid email {email!r}")
+            return None
+
+        age = row.get("age")
+        if age in (None, ""):
+            age = None
+        else:
+            try:
+                age = int(age)
+            except (TypeError, ValueError):
+                self.stderr.write(f"line {lineno}: age must be an integer")
+                return None
+            if age < 0:
+                self.stderr.write(f"line {lineno}: age must not be negative")
+                return None
+
+        return {
+            "email": email,
+            "password": row.get("password") or None,
+            "first_name": row.get("first_name") or "",
+            "last_name": row.get("last_name") or "",
+            "age": age,
+        }
+
+    def _import_batch(self, batch, pool, workers):
+        records = []
+        for lineno, row in batch:
+            record = self._clean(lineno, row)
+            if record is None:
+                self.counts["invalid"] += 1
+            elif record["email"] in self.seen:
+                self.counts["skipped"] += 1
+            else:
+                self.seen.add(record["email"])
+                records.append(record)
+
+        existing = dict(
+            User.objects.using(self.database)
+            .filter(email__in=[r["email"] for r in records])
+            .values_list("email", "pk")
+        )
+        if not self.update:
+            # Don't spend hashing time on rows that will be skipped anyway.
+            self.counts["skipped"] += len(existing)
+            records = [r for r in records if r["email"] not in existing]
+        if not records:
+            return
+
+        passwords = [r.pop("password") for r in records]
+        hashes = hashing.hash_many(passwords, pool=pool, workers=workers)
+        users = []
+        for record, encoded in zip(records, hashes):
+            user = User.objects.build_user(**record)
+            user.password = encoded
+            users.append(user)
+
+        if self.update:
+            features = connections[self.database].features
+            unique_fields = ["email"] if features.supports_update_conflicts_with_target else None
+            # Rows without a password keep the stored one (and its tokens).
+            with_password = [user for user, password in zip(users, passwords) if password is not None]
+            without_password = [user for user, password in zip(users, passwords) if password is None]
+            with transaction.atomic(using=self.database):
+                for group, fields in ((with_password, UPDATE_FIELDS), (without_password, PROFILE_FIELDS)):
+                    if group:
+                        User.objects.using(self.database).bulk_create(
+                            group, update_conflicts=True, unique_fields=unique_fields, update_fields=fields,
+                        )
+                revoked = self._revoke({user.email for user in with_password} & existing.keys())
+            # Only after commit, so no worker reloads the old row meanwhile.
+            self._invalidate(existing.values(), revoked)
+            self.counts["updated"] += len(existing)
+            self.counts["created"] += len(users) - len(existing)
+        else:
+            # ignore_conflicts covers emails inserted concurrently since the lookup above.
+            User.objects.using(self.database).bulk_create(users, ignore_conflicts=True)
+            self.counts["created"] += len(users)
+
+    def _revoke(self, emails):
+        """
+        Bump token_version of the users whose passwords were just replaced:
+        bulk_create() sends no post_save, so core.signals doesn't.
+        """
+        users = User.objects.using(self.database).filter(email__in=emails)
+        users.update(token_version=F("token_version") + 1)
+        return list(users.only("pk", "token_version", "is_active"))
+
+    def _invalidate(self, user_ids, revoked):
+        """What core.signals.publish_user_epoch does for a save()."""
+        store = get_store()
+        for user in revoked:
+            store.set(user.pk, user_epoch(user))
+        for user_id in user_ids:
+            user_cache.invalidate(user_id)
+            forget_user(user_id)
+
+    def _report(self, started, final=False):
+        elapsed = time.perf_counter() - started
+        processed = sum(self.counts.values())
+        rate = processed / elapsed if elapsed else 0.0
+        summary = ", ".join(f"{k} {v}" for k, v in self.counts.items())
+        line = f"{processed} rows in {elapsed:.1f}s ({rate:.0f} rows/s): {summary}"
+        self.stdout.write(self.style.SUCCESS(line) if final else line)
@@ -0,0 +1,99 @@
+import hashlib
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+
+class Command(BaseCommand):
+    help = (
+        "Migrate every database alias that has unapplied migrations, in parallel. "
+        "Migration files are loaded once and compared with each alias's "
+        "django_migrations table; up-to-date aliases are skipped. Also creates "
+        "missing database cache tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", action="append", dest="databases",
+                            help="Alias to consider (repeatable). Defaults to every non-replica alias.")
+        parser.add_argument("--jobs", type=int, default=4, help="Aliases migrated at the same time.")
+        parser.add_argument("--plan", action="store_true", help="Only list pending migrations per alias.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        replicas = {alias for aliases in settings.DATABASE_REPLICAS.values() for alias in aliases}
+        aliases = options["databases"] or [alias for alias in settings.DATABASES if alias not in replicas]
+        unknown = set(aliases) - set(settings.DATABASES)
+        if unknown:
+            raise CommandError(f"Unknown database alias(es): {', '.join(sorted(unknown))}")
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        available = loader.disk_migrations
+        fingerprint = hashlib.sha256("\n".join(sorted(f"{a}.{n}" for a, n in available)).encode()).hexdigest()[:12]
+        self.stdout.write(f"{len(available)} migrations on disk (fingerprint {fingerprint})")
+
+        pending = {}
+        for alias in aliases:
+            todo = _pending(available, MigrationRecorder(connections[alias]).applied_migrations())
+            if not todo:
+                self.stdout.write(f"  {alias}: up to date")
+                continue
+            pending[alias] = todo
+            self.stdout.write(f"  {alias}: {len(todo)} pending")
+            if options["plan"] or options["verbosity"] >= 2:
+                for app_label, name in todo:
+                    self.stdout.write(f"    {app_label}.{name}")
+        if not options["plan"]:
+            # DatabaseCache tables (CACHE_URL=sqlitecache:// or dbcache://); the router picks the alias.
+            for alias in aliases:
+                call_command("createcachetable", database=alias, verbosity=0)
+        connections.close_all()
+
+        if options["plan"] or not pending:
+            return
+
+        with ThreadPoolExecutor(max(1, options["jobs"])) as pool:
+            results = list(pool.map(self._migrate, pending))
+
+        failed = []
+        for alias, proc, elapsed in results:
+            if proc.returncode == 0:
+                self.stdout.write(f"  {alias}: migrated in {elapsed:.2f}s")
+            else:
+                failed.append(alias)
+                self.stderr.write(f"  {alias}: failed after {elapsed:.2f}s\n{proc.stdout}{proc.stderr}")
+        if failed:
+            raise CommandError(f"Migrating {', '.join(failed)} failed.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {len(pending)} of {len(aliases)} aliases in {time.perf_counter() - started:.2f}s"
+        ))
+
+    def _migrate(self, alias):
+        # A process per alias: connections and migration state aren't shared.
+        # System checks already ran for this command.
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "manage.py", "migrate", "--database", alias, "--noinput", "--skip-checks"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        return alias, proc, time.perf_counter() - started
+
+
+def _pending(available, applied):
+    """Migration keys on disk that aren't applied, counting squashed migrations as migrate does."""
+    replaced = {key for name, m in available.items() if name in applied for key in m.replaces}
+    return sorted(
+        key for key, migration in available.items()
+        if key not in applied
+        and key not in replaced
+        and not (migration.replaces and all(r in applied for r in migration.replaces))
+    )
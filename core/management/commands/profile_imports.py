@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MARKER = "--profile-imports--"
+
+# Runs in a fresh interpreter: set Django up (unless measuring the setup
+# itself), then import the target with import timing and/or tracemalloc on.
+PROBE = r"""
+import importlib, json, os, sys, time, tracemalloc
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app404.settings")
+import django
+target, memory = sys.argv[1], sys.argv[2] == "1"
+if target:
+    django.setup()
+if memory:
+    tracemalloc.start()
+sys.stderr.write("%s\n")
+sys.stderr.flush()
+started = time.perf_counter()
+if target:
+    importlib.import_module(target)
+else:
+    django.setup()
+result = {"seconds": time.perf_counter() - started}
+if memory:
+    result["current"], result["peak"] = tracemalloc.get_traced_memory()
+print(json.dumps(result))
+""" % MARKER
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the import time and memory of django.setup() and of each app's "
+        "URLconf (with its views and services), per app and per package. Each "
+        "measurement runs in a fresh interpreter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("apps", nargs="*", help="App labels (default: core and TEAM_APPS).")
+        parser.add_argument("--top", type=int, default=3, help="Heaviest packages (or modules with -v 2) to list.")
+        parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        apps = options["apps"] or ["core", *settings.TEAM_APPS]
+        targets = [("django.setup()", "")]
+        for app in apps:
+            module = f"{app}.urls" if find_spec(f"{app}.urls") else app
+            if find_spec(module) is None:
+                raise CommandError(f"No module named {app!r}")
+            targets.append((app, module))
+
+        with ThreadPoolExecutor(max(1, options["jobs"])) as pool:
+            results = list(pool.map(self._measure, [module for _, module in targets]))
+
+        self.verbose = options["verbosity"] >= 2
+        self.top = options["top"]
+        (_, setup), *per_app = zip([label for label, _ in targets], results)
+        self.stdout.write(f"django.setup(): {self._summary(setup)}")
+        self.stdout.write(f"{'app':<10} {'seconds':>8} {'MiB':>7}  heaviest")
+        for label, result in sorted(per_app, key=lambda item: -item[1]["seconds"]):
+            self.stdout.write(
+                f"{label:<10} {result['seconds']:8.3f} {result['current'] / 2**20:7.1f}  {self._heaviest(result)}"
+            )
+
+    def _measure(self, module):
+        timing, imports = self._probe(module, memory=False)
+        memory, _ = self._probe(module, memory=True)
+        return {**timing, "current": memory["current"], "peak": memory["peak"], "imports": imports}
+
+    def _probe(self, module, memory):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE, module, "1" if memory else "0"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Importing {module or 'django'} failed:\n{proc.stderr[-2000:]}")
+        _, _, timings = proc.stderr.partition(MARKER + "\n")
+        return json.loads(proc.stdout.strip().splitlines()[-1]), _parse_importtime(timings)
+
+    def _summary(self, result):
+        return (
+            f"{result['seconds']:.3f}s, {result['current'] / 2**20:.1f} MiB retained "
+            f"({result['peak'] / 2**20:.1f} MiB peak); {self._heaviest(result)}"
+        )
+
+    def _heaviest(self, result):
+        if self.verbose:
+            # Individual modules by cumulative time, outermost first on ties.
+            ranked = sorted(result["imports"], key=lambda row: -row[1])[:self.top]
+            return ", ".join(f"{name} {cumulative / 1e6:.3f}s" for _, cumulative, name in ranked)
+        packages = Counter()
+        for self_us, _, name in result["imports"]:
+            packages[name.split(".")[0]] += self_us
+        return ", ".join(f"{name} {us / 1e6:.3f}s" for name, us in packages.most_common(self.top))
+
+
+def _parse_importtime(text):
+    """(self_us, cumulative_us, module) for every `-X importtime` line."""
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import HEADER, QUERY_PARAM, make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a token that makes RequestProfilerMiddleware profile the given staff "
+        "user's requests. Send it as the X-Profile header or the _profile query parameter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("email")
+        parser.add_argument("--memory", action="store_true", help="Also diff tracemalloc snapshots.")
+        parser.add_argument("--ttl", type=int, default=None,
+                            help="Seconds the token stays valid (default: PROFILING_TOKEN_TTL).")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User._default_manager.filter(**{User.USERNAME_FIELD: options["email"]}).first()
+        if user is None:
+            raise CommandError(f"No user {options['email']}")
+        if not user.is_staff:
+            raise CommandError(f"{options['email']} is not staff; only staff requests are profiled.")
+
+        ttl = settings.PROFILING_TOKEN_TTL if options["ttl"] is None else options["ttl"]
+        token = make_token(user, memory=options["memory"], ttl=ttl)
+        self.stdout.write(token)
+        if options["verbosity"] >= 2:
+            header = HEADER[len("HTTP_"):].replace("_", "-").title()
+            self.stderr.write(f"Valid for {ttl}s. Send '{header}: <token>' or ?{QUERY_PARAM}=<token>; "
+                              f"results go to {settings.PROFILING_DIR}.")
@@ -0,0 +1,108 @@
+import datetime
+import os
+
+from cryptography.hazmat.primitives import serialization
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.jwt_keys import (
+    ASYMMETRIC_ALGORITHMS,
+    KID_FORMAT,
+    PRIVATE_SUFFIX,
+    PUBLIC_SUFFIX,
+    STAGED_SUFFIX,
+    generate_private_key,
+    private_key_pem,
+    public_key_pem,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotate the JWT signing key in JWT_KEYS_DIR in two steps. --stage generates the next key "
+        "and publishes it in the JWKS without signing with it; --activate, at least JWT_JWKS_MAX_AGE "
+        "seconds later, makes it the signing key and retires the previous ones, so verifiers "
+        "holding a cached JWKS already know it. Without either, the first key of an empty "
+        "directory is created active and otherwise a key is staged. Retired keys keep their "
+        "public half so tokens they signed stay valid; keep enough of them to cover "
+        "JWT_REFRESH_TTL_SECONDS between rotations."
+    )
+
+    def add_arguments(self, parser):
+        step = parser.add_mutually_exclusive_group()
+        step.add_argument("--stage", action="store_true", help="Generate and publish the next key.")
+        step.add_argument("--activate", action="store_true", help="Start signing with the staged key.")
+        parser.add_argument("--force", action="store_true",
+                            help="With --activate, don't wait for cached JWKS copies to expire.")
+        parser.add_argument("--algorithm", choices=ASYMMETRIC_ALGORITHMS, default=None)
+        parser.add_argument("--keep", type=int, default=2, help="Retired public keys to keep (default: 2).")
+
+    def handle(self, *args, **options):
+        algorithm = options["algorithm"] or settings.JWT_ALGORITHM
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise CommandError(f"JWT_ALGORITHM is {algorithm}; pass --algorithm RS256 or EdDSA.")
+        if settings.JWT_ACTIVE_KEY_ID:
+            raise CommandError("JWT_ACTIVE_KEY_ID pins the signing key; unset it before rotating.")
+
+        directory = settings.JWT_KEYS_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        staged = sorted(directory.glob(f"*{STAGED_SUFFIX}"))
+
+        if options["activate"]:
+            if not staged:
+                raise CommandError("No staged key; run rotate_jwt_key --stage first.")
+            self._activate(directory, staged[-1], options)
+        elif options["stage"] or self._signers(directory):
+            if staged:
+                raise CommandError(f"Key {staged[-1].name[: -len(STAGED_SUFFIX)]} is already staged; "
+                                   "activate it first.")
+            kid = self._create(directory, algorithm, STAGED_SUFFIX)
+            self.stdout.write(
+                f"Staged {algorithm} signing key {kid}; it is published now. Run rotate_jwt_key "
+                f"--activate in {settings.JWT_JWKS_MAX_AGE}s or later."
+            )
+        else:
+            kid = self._create(directory, algorithm, PRIVATE_SUFFIX)
+            self.stdout.write(f"Created {algorithm} signing key {kid}")
+
+    def _signers(self, directory):
+        return [path for path in directory.glob(f"*{PRIVATE_SUFFIX}")
+                if not path.name.endswith((PUBLIC_SUFFIX, STAGED_SUFFIX))]
+
+    def _create(self, directory, algorithm, suffix):
+        kid = timezone.now().strftime(KID_FORMAT)
+        path = directory / f"{kid}{suffix}"
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            raise CommandError(f"Key {kid} already exists; wait a second and retry.")
+        with os.fdopen(fd, "wb") as f:
+            f.write(private_key_pem(generate_private_key(algorithm)))
+        return kid
+
+    def _activate(self, directory, staged, options):
+        kid = staged.name[: -len(STAGED_SUFFIX)]
+        published = datetime.datetime.strptime(kid, KID_FORMAT).replace(tzinfo=datetime.timezone.utc)
+        wait = settings.JWT_JWKS_MAX_AGE - (timezone.now() - published).total_seconds()
+        if wait > 0 and not options["force"]:
+            raise CommandError(
+                f"Key {kid} was published {settings.JWT_JWKS_MAX_AGE - wait:.0f}s ago; cached JWKS "
+                f"copies may not include it for another {wait:.0f}s (or pass --force)."
+            )
+
+        old_signers = self._signers(directory)
+        staged.rename(directory / f"{kid}{PRIVATE_SUFFIX}")
+        self.stdout.write(f"Activated signing key {kid}")
+
+        for old in old_signers:
+            old_kid = old.name[: -len(PRIVATE_SUFFIX)]
+            key = serialization.load_pem_private_key(old.read_bytes(), password=None)
+            (directory / f"{old_kid}{PUBLIC_SUFFIX}").write_bytes(public_key_pem(key.public_key()))
+            old.unlink()
+            self.stdout.write(f"Retired key {old_kid}")
+
+        retired = sorted(directory.glob(f"*{PUBLIC_SUFFIX}"))
+        for old in retired[: max(len(retired) - options["keep"], 0)]:
+            old.unlink()
+            self.stdout.write(f"Removed key {old.name[: -len(PUBLIC_SUFFIX)]}")
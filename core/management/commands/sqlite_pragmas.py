@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.sqlite import pragmas_for, read_pragma
+
+SHOWN = ["journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "temp_store", "page_size"]
+
+
+class Command(BaseCommand):
+    help = "Show configured vs effective SQLite pragmas for each SQLite database alias."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", action="append", dest="databases",
+                            help="Alias to inspect (repeatable). Defaults to every SQLite alias.")
+
+    def handle(self, *args, **options):
+        aliases = options["databases"] or [c.alias for c in connections.all() if c.vendor == "sqlite"]
+        mismatched = 0
+        for alias in aliases:
+            connection = connections[alias]
+            if connection.vendor != "sqlite":
+                raise CommandError(f"{alias} is not a SQLite database")
+            connection.ensure_connection()
+            configured = pragmas_for(alias)
+
+            self.stdout.write(f"{alias} ({connection.settings_dict['NAME']})")
+            for name in [*SHOWN, *(n for n in configured if n not in SHOWN)]:
+                effective = str(read_pragma(connection.connection, name)).lower()
+                wanted = configured.get(name)
+                line = f"  {name:<14} {effective}"
+                if wanted is None:
+                    line += "  (sqlite default)"
+                elif wanted != effective:
+                    mismatched += 1
+                    line = self.style.WARNING(f"{line}  (configured {wanted})")
+                self.stdout.write(line)
+
+        if mismatched:
+            self.stderr.write(f"{mismatched} pragma(s) differ from the configuration.")
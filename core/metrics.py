@@ -0,0 +1,219 @@
+"""
+Per-request timing: wall time, queries and query time per database alias,
+and template render time.
+
+core.middleware.RequestMetricsMiddleware opens a scope for each request,
+reports the numbers in a Server-Timing header and folds them into
+per-process aggregates keyed by URL route (the pattern, so ids in paths
+don't multiply series). /api/metrics/ serves those in Prometheus text
+format, together with the connection, password hashing and user cache
+counters. Like those, they are per worker process; the pid label tells
+workers apart. A scrape is answered by whichever worker accepts it, so one
+response is a sample of one process, not the whole service: scrape the
+workers individually or aggregate by pid over time.
+
+Collection is a perf_counter pair around each query and template render,
+and nothing at all outside a request scope.
+"""
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+# Upper bounds (seconds) of the request duration histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    __slots__ = ("db", "template")
+
+    def __init__(self):
+        self.db = {}  # alias -> [queries, seconds]
+        self.template = 0.0
+
+    def server_timing(self, total) -> str:
+        parts = [f"total;dur={total * 1000:.1f}"]
+        for alias, (queries, seconds) in sorted(self.db.items()):
+            parts.append(f'db-{alias};dur={seconds * 1000:.1f};desc="{queries} queries"')
+        if self.template:
+            parts.append(f"tpl;dur={self.template * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = ContextVar("core_metrics_request", default=None)
+
+
+def begin_request():
+    return _current.set(RequestTimings())
+
+
+def end_request(token) -> RequestTimings:
+    timings = _current.get()
+    _current.reset(token)
+    return timings
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        entry = timings.db.setdefault(context["connection"].alias, [0, 0.0])
+        entry[0] += 1
+        entry[1] += time.perf_counter() - started
+
+
+@receiver(connection_created, dispatch_uid="core.metrics.instrument")
+def instrument_connection(sender, connection, **kwargs):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, adding render time to the request's timings."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name).template, self)
+
+
+class _RouteStats:
+    __slots__ = ("buckets", "count", "seconds", "db", "template")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.db = {}  # alias -> [queries, seconds]
+        self.template = 0.0
+
+
+_lock = threading.Lock()
+_routes = {}  # (route, method) -> _RouteStats
+
+
+def record(route, method, total, timings):
+    index = bisect.bisect_left(BUCKETS, total)
+    with _lock:
+        stats = _routes.get((route, method))
+        if stats is None:
+            stats = _routes[route, method] = _RouteStats()
+        if index < len(BUCKETS):
+            stats.buckets[index] += 1
+        stats.count += 1
+        stats.seconds += total
+        stats.template += timings.template
+        for alias, (queries, seconds) in timings.db.items():
+            entry = stats.db.setdefault(alias, [0, 0.0])
+            entry[0] += queries
+            entry[1] += seconds
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition (format 0.0.4) of this process's metrics."""
+    from core import db_connections, hashing
+    from core.user_cache import user_cache
+
+    with _lock:
+        routes = sorted(
+            ((route, method, list(s.buckets), s.count, s.seconds, {a: list(v) for a, v in s.db.items()}, s.template)
+             for (route, method), s in _routes.items()),
+            key=lambda row: row[:2],
+        )
+
+    lines = [
+        "# HELP app404_process_info Worker process serving this scrape.",
+        "# TYPE app404_process_info gauge",
+        f"app404_process_info{_labels(pid=os.getpid())} 1",
+        "# HELP app404_request_duration_seconds Request wall time by URL route.",
+        "# TYPE app404_request_duration_seconds histogram",
+    ]
+    for route, method, buckets, count, seconds, _, _ in routes:
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f"app404_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} {cumulative}")
+        lines.append(f"app404_request_duration_seconds_bucket{_labels(route=route, method=method, le='+Inf')} {count}")
+        lines.append(f"app404_request_duration_seconds_sum{_labels(route=route, method=method)} {seconds:.6f}")
+        lines.append(f"app404_request_duration_seconds_count{_labels(route=route, method=method)} {count}")
+
+    lines += ["# HELP app404_db_queries_total Queries run by requests, per URL route and database alias.",
+              "# TYPE app404_db_queries_total counter"]
+    for route, method, _, _, _, db, _ in routes:
+        for alias, (queries, _) in sorted(db.items()):
+            lines.append(f"app404_db_queries_total{_labels(route=route, method=method, alias=alias)} {queries}")
+    lines += ["# HELP app404_db_seconds_total Time spent in queries, per URL route and database alias.",
+              "# TYPE app404_db_seconds_total counter"]
+    for route, method, _, _, _, db, _ in routes:
+        for alias, (_, seconds) in sorted(db.items()):
+            lines.append(f"app404_db_seconds_total{_labels(route=route, method=method, alias=alias)} {seconds:.6f}")
+    lines += ["# HELP app404_template_seconds_total Time spent rendering templates, per URL route.",
+              "# TYPE app404_template_seconds_total counter"]
+    for route, method, _, _, _, _, template in routes:
+        lines.append(f"app404_template_seconds_total{_labels(route=route, method=method)} {template:.6f}")
+
+    connections = db_connections.stats()
+    for key, help_text in (("opened", "Database connections opened."),
+                           ("reused", "Requests served by an already open connection."),
+                           ("closed_idle", "Connections closed after DB_CONN_MAX_IDLE.")):
+        lines += [f"# HELP app404_db_connections_{key}_total {help_text}",
+                  f"# TYPE app404_db_connections_{key}_total counter"]
+        for alias, counts in sorted(connections.items()):
+            lines.append(f"app404_db_connections_{key}_total{_labels(alias=alias)} {counts[key]}")
+
+    hashing_stats = hashing.executor.stats()
+    for key, kind, help_text in (
+        ("completed", "counter", "Passwords hashed or checked."),
+        ("rejected", "counter", "Hashing requests shed because the queue was full."),
+        ("in_flight", "gauge", "Hashing requests running or queued."),
+        ("hash_seconds_total", "counter", "Time spent hashing."),
+        ("queue_wait_seconds_total", "counter", "Time hashing requests waited for a worker."),
+    ):
+        name = f"app404_password_hash_{key}" + ("_total" if kind == "counter" and not key.endswith("_total") else "")
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {hashing_stats[key]}"]
+
+    cache_stats = user_cache.stats()
+    for key, kind, help_text in (
+        ("size", "gauge", "Users in the token user cache."),
+        ("hits", "counter", "Token user cache hits."),
+        ("misses", "counter", "Token user cache misses."),
+    ):
+        name = f"app404_user_cache_{key}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {cache_stats[key]}"]
+
+    return "\n".join(lines) + "\n"
@@ -1,45 +1,554 @@
+import hashlib
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
+from django.utils.text import compress_string
 from jwt import ExpiredSignatureError, InvalidTokenError
 
+from core import db_router, metrics, profiling, ratelimit
 from core.jwt_utils import decode_token
+from core.revocation import REVOKED, get_store, user_epoch
+from core.user_cache import user_cache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - installed by whitenoise[brotli]
+    brotli = None
 
 User = get_user_model()
 
 
+def get_request_token(request):
+    token = request.COOKIES.get("access_token")
+    if not token:
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            token = auth.split(" ", 1)[1].strip()
+    return token or None
+
+
+def _access_payload(token):
+    try:
+        payload = decode_token(token)
+    except (ExpiredSignatureError, InvalidTokenError):
+        return None
+    return payload if payload.get("type") == "access" else None
+
+
+def get_token_user(request, token):
+    """
+    Decode an access token and load its user, or return None.
+    Sets request.jwt_payload on success.
+    """
+    payload = _access_payload(token)
+    if payload is None:
+        return None
+
+    user = load_token_user(payload.get("sub"), payload.get("tv"), payload["exp"])
+    if user is not None:
+        request.jwt_payload = payload
+    return user
+
+
+async def aget_token_user(request, token):
+    """Async version of get_token_user()."""
+    payload = _access_payload(token)
+    if payload is None:
+        return None
+
+    user = await aload_token_user(payload.get("sub"), payload.get("tv"), payload["exp"])
+    if user is not None:
+        request.jwt_payload = payload
+    return user
+
+
+def _stale_epoch(epoch, tv):
+    """
+    None to reject the token outright, else whether the stored epoch can't
+    be trusted for it: tokens newer than the store (a logout or login seen
+    by another worker's in-process store) and REVOKED users are settled by
+    the database, which then corrects the store.
+    """
+    if epoch is None or epoch == tv:
+        return False
+    if epoch != REVOKED and tv < epoch:
+        return None
+    return True
+
+
+def load_token_user(user_id, tv, expires_at):
+    """
+    Return the active user for a token's sub/tv claims, or None if revoked.
+    Revocation store and user cache hits avoid the users table entirely; the
+    cache is only used with a store, which carries other workers' logouts.
+    """
+    if not isinstance(tv, int):
+        return None
+    store = get_store()
+    stale = _stale_epoch(store.get(user_id), tv)
+    if stale is None:
+        return None
+
+    cache = store.enabled
+    user = user_cache.get(user_id, tv) if cache and not stale else None
+    if user is None:
+        user = User.objects.filter(id=user_id, is_active=True).first()
+        if not user:
+            return None
+
+        (store.set if stale else store.seed)(user.pk, user_epoch(user))
+        if user.token_version != tv:
+            return None
+        if cache:
+            user_cache.set(user, expires_at=expires_at)
+    return user
+
+
+async def _call_store(store, method, *args):
+    if store.blocking:
+        return await sync_to_async(method, thread_sensitive=False)(*args)
+    return method(*args)
+
+
+async def aload_token_user(user_id, tv, expires_at):
+    """
+    Async version of load_token_user(). With an in-process revocation store and
+    a user cache hit it completes without leaving the event loop.
+    """
+    if not isinstance(tv, int):
+        return None
+    store = get_store()
+    stale = _stale_epoch(await _call_store(store, store.get, user_id), tv)
+    if stale is None:
+        return None
+
+    cache = store.enabled
+    user = user_cache.get(user_id, tv) if cache and not stale else None
+    if user is None:
+        user = await User.objects.filter(id=user_id, is_active=True).afirst()
+        if not user:
+            return None
+
+        await _call_store(store, store.set if stale else store.seed, user.pk, user_epoch(user))
+        if user.token_version != tv:
+            return None
+        if cache:
+            user_cache.set(user, expires_at=expires_at)
+    return user
+
+
 class JWTAuthenticationMiddleware(MiddlewareMixin):
     """
     If a valid access_token cookie (or Authorization header) exists, set request.user accordingly.
+
+    Like Django's session auth, the user is resolved lazily: the token is only
+    decoded (and the user loaded) the first time a view or template touches
+    request.user. Async views await request.auser() instead, which loads the
+    user with the async ORM. Paths in JWT_ANONYMOUS_PATHS are skipped entirely.
     """
 
     def process_request(self, request):
-        if hasattr(request, "user") and getattr(request.user, "is_authenticated", False):
-            return
+        if not hasattr(request, "user"):
+            # Stateless middleware profiles run without AuthenticationMiddleware.
+            request.user = AnonymousUser()
 
-        token = request.COOKIES.get("access_token")
-        if not token:
-            auth = request.headers.get("Authorization", "")
-            if auth.startswith("Bearer "):
-                token = auth.split(" ", 1)[1].strip()
+        session_user = request.user
+        token = None
+        if not request.path_info.startswith(tuple(settings.JWT_ANONYMOUS_PATHS)):
+            token = get_request_token(request)
 
+        async def auser():
+            if not hasattr(request, "_acached_user"):
+                request._acached_user = await _aresolve(request, session_user, token)
+            return request._acached_user
+
+        request.auser = auser
         if not token:
             return
 
+        def _resolve():
+            # A session-authenticated user (e.g. admin login) wins, as before.
+            if session_user is not None and session_user.is_authenticated:
+                return session_user
+            return get_token_user(request, token) or session_user or AnonymousUser()
+
+        request.user = SimpleLazyObject(_resolve)
+
+    async def __acall__(self, request):
+        # process_request() only installs lazy resolvers, so unlike
+        # MiddlewareMixin there's no need to run it in a thread.
+        self.process_request(request)
+        return await self.get_response(request)
+
+
+async def _aresolve(request, session_user, token):
+    if type(session_user) is not AnonymousUser:
+        # Possibly a lazy session user; evaluating it queries the database.
+        if await sync_to_async(lambda: session_user.is_authenticated)():
+            return session_user
+    if token:
+        user = await aget_token_user(request, token)
+        if user is not None:
+            return user
+    return AnonymousUser()
+
+
+class AuthSubrequestMiddleware:
+    """
+    Answer nginx `auth_request` subrequests at AUTH_SUBREQUEST_PATH before the
+    rest of the middleware stack (sessions, CSRF, messages) runs.
+
+    A 204 carries the X-User-* headers plus Cache-Control/Expires bounded by the
+    token's remaining lifetime and AUTH_SUBREQUEST_MAX_AGE, and X-Auth-Cache-Key
+    (a digest of the token), so gateways can micro-cache the decision, e.g.:
+
+        proxy_cache_path /var/cache/nginx/auth keys_zone=auth:10m;
+        location = /_auth {
+            internal;
+            proxy_pass http://core:8000/api/auth/check/;
+            proxy_pass_request_body off;
+            proxy_set_header Content-Length "";
+            proxy_cache auth;
+            proxy_cache_key $cookie_access_token$http_authorization;
+        }
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info != settings.AUTH_SUBREQUEST_PATH:
+            return self.get_response(request)
+
+        token = get_request_token(request)
+        user = get_token_user(request, token) if token else None
+        return self._answer(request, token, user)
+
+    async def __acall__(self, request):
+        if request.path_info != settings.AUTH_SUBREQUEST_PATH:
+            return await self.get_response(request)
+
+        token = get_request_token(request)
+        user = await aget_token_user(request, token) if token else None
+        return self._answer(request, token, user)
+
+    def _answer(self, request, token, user):
+        if user is None:
+            resp = HttpResponse(status=401)
+            resp["Cache-Control"] = "no-store"
+            return resp
+
+        now = time.time()
+        max_age = max(0, min(int(request.jwt_payload["exp"] - now), settings.AUTH_SUBREQUEST_MAX_AGE))
+
+        resp = HttpResponse(status=204)
+        resp["X-User-Id"] = str(user.id)
+        resp["X-User-Email"] = user.email
+        resp["X-User-First-Name"] = user.first_name or ""
+        resp["X-User-Last-Name"] = user.last_name or ""
+        resp["X-User-Age"] = str(user.age or "")
+        resp["X-Auth-Cache-Key"] = hashlib.sha256(token.encode()).hexdigest()
+        resp["Cache-Control"] = f"public, max-age={max_age}"
+        resp["Expires"] = http_date(now + max_age)
+        resp["Vary"] = "Cookie, Authorization"
+        return resp
+
+
+class ReplicaPinMiddleware:
+    """
+    Scope core.db_router's read-your-writes pinning to the request, and keep
+    it for DB_REPLICA_PIN_SECONDS afterwards with a cookie listing the team
+    aliases written to, so the next requests of the same client don't read
+    stale rows from a lagging replica. Unused without DATABASE_REPLICAS.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = "db_pin"
+
+    def __init__(self, get_response):
+        if not any(settings.DATABASE_REPLICAS.values()):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sticky = self._sticky(request)
+        token = db_router.begin_request(sticky)
         try:
-            payload = decode_token(token)
-            if payload.get("type") != "access":
-                return
-
-            user_id = payload.get("sub")
-            tv = payload.get("tv")
-            user = User.objects.filter(id=user_id, is_active=True).first()
-            if not user:
-                return
-
-            if user.token_version != tv:
-                return
-
-            request.user = user
-            request.jwt_payload = payload
-        except (ExpiredSignatureError, InvalidTokenError):
-            return
+            response = self.get_response(request)
+        finally:
+            written = db_router.end_request(token)
+        return self._remember(response, sticky, written)
+
+    async def __acall__(self, request):
+        sticky = self._sticky(request)
+        token = db_router.begin_request(sticky)
+        try:
+            response = await self.get_response(request)
+        finally:
+            written = db_router.end_request(token)
+        return self._remember(response, sticky, written)
+
+    def _sticky(self, request):
+        value = request.COOKIES.get(self.cookie_name, "")
+        return {alias for alias in value.split(",") if alias in settings.DATABASE_REPLICAS}
+
+    def _remember(self, response, sticky, written):
+        if written:
+            response.set_cookie(
+                self.cookie_name,
+                ",".join(sorted(written | sticky)),
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Time each request, with queries and query time per database alias and
+    template render time (see core.metrics). Adds a Server-Timing header
+    when SERVER_TIMING_HEADER is on and aggregates per URL route for
+    /api/metrics/. Unused when REQUEST_METRICS_ENABLED is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        token = metrics.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = metrics.end_request(token)
+        return self._report(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        token = metrics.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = metrics.end_request(token)
+        return self._report(request, response, time.perf_counter() - started, timings)
+
+    def _report(self, request, response, total, timings):
+        match = request.resolver_match
+        metrics.record(match.route if match else "unmatched", request.method, total, timings)
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timings.server_timing(total)
+        return response
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        try:
+            if q.startswith("q=") and float(q[2:]) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of COMPRESSION_CONTENT_TYPES that are at least
+    COMPRESSION_MIN_SIZE bytes: brotli when the client accepts it and the
+    package is installed, gzip otherwise. HTML always gets gzip with
+    Django's BREACH mitigation (random bytes in the header), as pages can
+    carry CSRF tokens. Streaming responses (WhiteNoise's static files,
+    which are served pre-compressed) pass through. Unused when
+    COMPRESSION_ENABLED is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.content_types = frozenset(settings.COMPRESSION_CONTENT_TYPES)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _compress(self, request, response):
+        if (response.streaming or response.has_header("Content-Encoding")
+                or len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        content_type = response.get("Content-Type", "").partition(";")[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accepted = _accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is not None and "br" in accepted and content_type != "text/html":
+            encoding = "br"
+            compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif "gzip" in accepted:
+            encoding = "gzip"
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = encoding
+        # The compressed bytes differ from the identity ones, so a strong ETag
+        # becomes weak (RFC 9110 8.8.1); If-None-Match still matches weakly.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Enforce the view's @rate_limit rules and RATE_LIMITS prefixes (see
+    core.ratelimit) before the view runs and before anything evaluates
+    request.user, so throttled requests answer 429 without touching the
+    database. Unused when RATE_LIMIT_ENABLED is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.RATE_LIMIT_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django adapts process_view to the chain's mode by its type.
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return ratelimit.check(request, ratelimit.rules_for(request, view_func), ratelimit.throttled_response(view_func))
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return await ratelimit.acheck(
+            request, ratelimit.rules_for(request, view_func), ratelimit.throttled_response(view_func)
+        )
+
+
+class RequestProfilerMiddleware:
+    """
+    Profile a view for staff users who send a profiling token (see
+    core.profiling); everyone else passes straight through. Runs as a
+    view middleware, after authentication and CSRF, and must come last so
+    the view it calls is the one Django would have called.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django adapts process_view to the chain's mode by its type.
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        token = profiling.requested_token(request)
+        if token is None:
+            return None
+        options = profiling.read_token(token, request.user)
+        if options is None or not request.user.is_staff:
+            return None
+        if iscoroutinefunction(view_func):
+            view_func = async_to_sync(view_func)
+        return self._run(request, options, view_func, view_args, view_kwargs)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        token = profiling.requested_token(request)
+        if token is None:
+            return None
+        user = await request.auser()
+        options = profiling.read_token(token, user)
+        if options is None or not user.is_staff:
+            return None
+        if not iscoroutinefunction(view_func):
+            # In the request's sync thread, where Django would run the view.
+            return await sync_to_async(self._run)(request, options, view_func, view_args, view_kwargs)
+
+        profile = profiling.RequestProfile(request, memory=options["m"])
+        if not profile.start():
+            return None
+        try:
+            response = await view_func(request, *view_args, **view_kwargs)
+        finally:
+            headers = profile.stop()
+        return self._annotate(response, headers)
+
+    def _run(self, request, options, view_func, view_args, view_kwargs):
+        profile = profiling.RequestProfile(request, memory=options["m"])
+        if not profile.start():
+            return None
+        try:
+            response = view_func(request, *view_args, **view_kwargs)
+            if callable(getattr(response, "render", None)):
+                # DRF and TemplateResponse render after the view returns.
+                response = response.render()
+        finally:
+            headers = profile.stop()
+        return self._annotate(response, headers)
+
+    def _annotate(self, response, headers):
+        for name, value in headers.items():
+            response[name] = value
+        return response
@@ -5,18 +5,22 @@ from django.utils import timezone
 
 
 class UserManager(BaseUserManager):
-    def create_user(self, email, password=None, first_name="", last_name="", age=None, **extra_fields):
+    def build_user(self, email, first_name="", last_name="", age=None, **extra_fields):
+        """Return an unsaved user without a password set."""
         if not email:
             raise ValueError("Email is required")
         email = self.normalize_email(email)
 
-        user = self.model(
+        return self.model(
             email=email,
             first_name=first_name.strip(),
             last_name=last_name.strip(),
             age=age,
             **extra_fields,
         )
+
+    def create_user(self, email, password=None, first_name="", last_name="", age=None, **extra_fields):
+        user = self.build_user(email, first_name=first_name, last_name=last_name, age=age, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
         return user
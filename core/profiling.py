@@ -0,0 +1,152 @@
+"""
+On-demand profiling of single requests by staff users.
+
+A request carrying a profiling token, in the X-Profile header or the
+_profile query parameter, is run under cProfile by
+core.middleware.RequestProfilerMiddleware. The token comes from `manage.py
+profile_token <email>` and is signed, expiring and tied to one staff user.
+With --memory, a tracemalloc snapshot diff is taken as well. Results land in
+PROFILING_DIR, keeping the newest PROFILING_KEEP requests:
+
+    <id>.prof       pstats data (python -m pstats, snakeviz)
+    <id>.mem.txt    allocation growth by line, with --memory
+
+and a summary is returned in X-Profile-* response headers. Requests
+without a token only pay for a header lookup.
+
+cProfile follows the thread that runs the view. Sync views are profiled
+in their own thread, including under ASGI. For async views that is the
+event loop thread, so queries they hand to sync_to_async show up as
+waiting, and coroutines of other requests running meanwhile show up too.
+tracemalloc counts allocations from every thread.
+
+Only one request per process is profiled at a time: Python 3.12 refuses a
+second active cProfile profiler, and overlapping tracemalloc snapshots
+would count each other's allocations. A profiling request that arrives
+while another is running is served unprofiled.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+SALT = "core.profiling"
+HEADER = "HTTP_X_PROFILE"
+QUERY_PARAM = "_profile"
+
+# Held from RequestProfile.start() to stop().
+_active = threading.Lock()
+
+
+def make_token(user, memory=False, ttl=None) -> str:
+    ttl = settings.PROFILING_TOKEN_TTL if ttl is None else ttl
+    return signing.dumps({"u": str(user.pk), "m": memory, "e": int(time.time()) + ttl}, salt=SALT)
+
+
+def requested_token(request):
+    """The raw token from the header or query string; cheap enough for every request."""
+    token = request.META.get(HEADER)
+    if token is None and f"{QUERY_PARAM}=" in request.META.get("QUERY_STRING", ""):
+        token = request.GET.get(QUERY_PARAM)
+    return token
+
+
+def read_token(token, user):
+    """The token's options if it is valid, unexpired and issued to `user`, else None."""
+    try:
+        payload = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return None
+    if payload.get("u") != str(user.pk) or payload.get("e", 0) < time.time():
+        return None
+    return payload
+
+
+class RequestProfile:
+    def __init__(self, request, memory=False):
+        self.request = request
+        self.memory = memory
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.profiler = cProfile.Profile()
+        self._started_tracing = False
+        self._snapshot = None
+        self._started = None
+        self.elapsed = None
+
+    def start(self) -> bool:
+        """Start profiling, or return False if another request is being profiled."""
+        if not _active.acquire(blocking=False):
+            logger.info("Not profiling %s %s: another profile is running", self.request.method, self.request.path)
+            return False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            self._snapshot = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        try:
+            self.profiler.enable()
+        except BaseException:
+            _active.release()
+            raise
+        return True
+
+    def stop(self):
+        try:
+            self.profiler.disable()
+            self.elapsed = time.perf_counter() - self._started
+            memory_diff = None
+            if self.memory:
+                memory_diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+                if self._started_tracing:
+                    tracemalloc.stop()
+                self._snapshot = None
+        finally:
+            _active.release()
+        return self._save(memory_diff)
+
+    def _save(self, memory_diff):
+        directory = settings.PROFILING_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(directory / f"{self.id}.prof")
+
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:3]
+        headers = {
+            "X-Profile-Id": self.id,
+            "X-Profile-Total-Ms": f"{self.elapsed * 1000:.1f}",
+            "X-Profile-Calls": str(stats.total_calls),
+            "X-Profile-Top": "; ".join(
+                f"{os.path.basename(file)}:{line}({name}) {tottime * 1000:.1f}ms"
+                for (file, line, name), (_, _, tottime, _, _) in top
+            ),
+        }
+        if memory_diff is not None:
+            growth = sum(stat.size_diff for stat in memory_diff)
+            lines = [f"{self.request.method} {self.request.get_full_path()}: {growth / 1024:+.1f} KiB"]
+            lines += [str(stat) for stat in memory_diff[:50]]
+            (directory / f"{self.id}.mem.txt").write_text("\n".join(lines) + "\n")
+            headers["X-Profile-Memory"] = f"{growth / 1024:+.1f} KiB" + "".join(
+                f"; {stat.traceback[0].filename.rsplit(os.sep, 1)[-1]}:{stat.traceback[0].lineno} "
+                f"{stat.size_diff / 1024:+.1f} KiB"
+                for stat in memory_diff[:3]
+            )
+        _rotate(directory)
+        return headers
+
+
+def _rotate(directory):
+    profiles = sorted(directory.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in profiles[settings.PROFILING_KEEP:]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".mem.txt").unlink(missing_ok=True)
@@ -0,0 +1,442 @@
+"""
+Rate limiting for expensive endpoints: the team11 submissions that start a
+paid LLM pipeline and login's password hash.
+
+Limits are declared on the view,
+
+    @rate_limit("5/m", key="user_or_ip")
+    @rate_limit("60/h", key="user_or_ip", algorithm="sliding_window")
+    def submit_writing(request): ...
+
+or for path prefixes in RATE_LIMITS. core.middleware.RateLimitMiddleware
+checks both in process_view, before any view code runs and before
+request.user is resolved, so a throttled request costs no queries; the
+decorator enforces its own limits where the middleware isn't installed.
+Rejected requests get 429 with Retry-After.
+
+Keys: "ip" (the client address, see _client_ip), "ip_email" (address and
+the normalised email of a login, so students behind one NAT or gateway
+don't share a bucket), "user" (the access token's sub claim, verified but
+not looked up; anonymous requests aren't limited), "user_or_ip", and
+"route" (one bucket shared by all clients). Each rule counts per view (or prefix), so limits on different
+endpoints don't share budgets, unless they name the same `scope`: the login
+API and the login page spend one budget. `methods` restricts a rule to
+some HTTP methods (e.g. a page's POST but not its GET), and `throttled`
+renders the 429 for views that don't answer JSON.
+
+Algorithms: "token_bucket" allows bursts of up to the limit and refills
+steadily; "sliding_window" allows the limit within any window of the period
+(weighting the previous fixed window, as the count is approximate).
+
+Rules that apply together are all-or-nothing: a request rejected by one
+doesn't use up the others.
+
+Counters live in RATE_LIMIT_STORE_URL:
+
+    memory://               per-process dict; each worker gets the full limit
+    sqlite:////path/db      shared by all workers on one host (default)
+    redis://host:6379/0     shared by all replicas (needs the `redis` package)
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from core import fastjson
+from core.fastjson import JsonResponse
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> tuple:
+    """'5/m' -> (5, 60); '100/10m' -> (100, 600)."""
+    try:
+        count, period = rate.split("/")
+        multiplier, unit = period[:-1] or "1", period[-1]
+        return int(count), int(multiplier) * _PERIODS[unit]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured(f"Invalid rate {rate!r}; use e.g. '5/m', '100/h' or '20/10s'.")
+
+
+class TokenBucket:
+    """State: (tokens, updated_at)."""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+
+    def hit(self, state, now):
+        """(new state, seconds to wait; 0 when the hit is allowed)."""
+        tokens, updated_at = state or (self.limit, now)
+        tokens = min(self.limit, tokens + (now - updated_at) * self.limit / self.period)
+        if tokens >= 1:
+            return (tokens - 1, now), 0.0
+        return (tokens, now), (1 - tokens) * self.period / self.limit
+
+
+class SlidingWindow:
+    """State: (window_start, hits in that window, hits in the window before)."""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+
+    def hit(self, state, now):
+        window = now // self.period * self.period
+        start, current, previous = state or (window, 0, 0)
+        if window != start:
+            previous = current if window - start == self.period else 0
+            start, current = window, 0
+        elapsed = (now - start) / self.period
+        if previous * (1 - elapsed) + current + 1 <= self.limit:
+            return (start, current + 1, previous), 0.0
+        if current + 1 > self.limit:
+            # Wait for this window to become the previous one and decay enough.
+            wait = start + self.period - now + self.period * (1 - (self.limit - 1) / current)
+        else:
+            wait = self.period * (1 - (self.limit - 1 - current) / previous) - (now - start)
+        return (start, current, previous), max(wait, 0.001)
+
+
+ALGORITHMS = {"token_bucket": TokenBucket, "sliding_window": SlidingWindow}
+
+
+def _client_ip(request):
+    """
+    With RATE_LIMIT_IP_HEADER (X-Forwarded-For by default), the address
+    RATE_LIMIT_PROXY_HOPS entries from the right: the one our own proxy
+    appended, which clients can't forge. Else REMOTE_ADDR.
+    """
+    if settings.RATE_LIMIT_IP_HEADER:
+        hops = [hop.strip() for hop in request.META.get(settings.RATE_LIMIT_IP_HEADER, "").split(",") if hop.strip()]
+        if hops:
+            return hops[-min(settings.RATE_LIMIT_PROXY_HOPS, len(hops))]
+    return request.META.get("REMOTE_ADDR")
+
+
+def _login_email(request):
+    """The normalised email of a JSON or form login, without touching the database."""
+    if not hasattr(request, "_rate_limit_email"):
+        if request.content_type == "application/json":
+            try:
+                data = fastjson.loads(request.body)
+            except ValueError:
+                data = None
+            email = data.get("email") if isinstance(data, dict) else None
+        else:
+            email = request.POST.get("email")
+        request._rate_limit_email = email.strip().lower() if isinstance(email, str) else ""
+    return request._rate_limit_email
+
+
+def _token_subject(request):
+    from core.middleware import _access_payload, get_request_token
+
+    if not hasattr(request, "_rate_limit_sub"):
+        token = get_request_token(request)
+        payload = _access_payload(token) if token else None
+        request._rate_limit_sub = str(payload["sub"]) if payload and payload.get("sub") is not None else None
+    return request._rate_limit_sub
+
+
+def _user_or_ip(request):
+    sub = _token_subject(request)
+    return f"user:{sub}" if sub is not None else f"ip:{_client_ip(request)}"
+
+
+KEYS = {
+    "ip": lambda request: f"ip:{_client_ip(request)}",
+    "ip_email": lambda request: f"ip:{_client_ip(request)}|email:{_login_email(request)}",
+    "user": lambda request: f"user:{sub}" if (sub := _token_subject(request)) is not None else None,
+    "user_or_ip": _user_or_ip,
+    "route": lambda request: "all",
+}
+
+
+@dataclass(frozen=True)
+class Rule:
+    rate: str
+    key: str = "user_or_ip"
+    algorithm: str = "token_bucket"
+    scope: str = ""
+    methods: tuple = ()
+
+    def __post_init__(self):
+        if self.key not in KEYS:
+            raise ImproperlyConfigured(f"Unknown rate limit key {self.key!r}; expected one of {sorted(KEYS)}.")
+        if self.algorithm not in ALGORITHMS:
+            raise ImproperlyConfigured(f"Unknown rate limit algorithm {self.algorithm!r}; expected one of {sorted(ALGORITHMS)}.")
+        limit, period = parse_rate(self.rate)
+        object.__setattr__(self, "limiter", ALGORITHMS[self.algorithm](limit, period))
+
+    def bucket(self, request):
+        """The store key for this request, or None if the rule doesn't apply."""
+        if self.methods and request.method not in self.methods:
+            return None
+        ident = KEYS[self.key](request)
+        return None if ident is None else f"{self.scope}|{self.rate}|{self.algorithm}|{ident}"
+
+
+def _apply(limiters, states, now):
+    """
+    Run every limiter on its state. All hits count only if all are allowed,
+    so a request rejected by one rule doesn't use up the others: (new
+    states or None, longest wait).
+    """
+    results = [limiter.hit(state, now) for limiter, state in zip(limiters, states)]
+    wait = max(w for _, w in results)
+    return (None if wait else [state for state, _ in results]), wait
+
+
+class RateLimitStore:
+    # Whether calls do I/O; async callers run blocking stores in a thread.
+    blocking = True
+
+    def hit_many(self, entries, now):
+        """
+        Apply each (key, limiter) atomically, all or nothing (see _apply),
+        and return the wait; 0 when the request is allowed.
+        """
+        raise NotImplementedError
+
+    def hit(self, key, limiter, now):
+        return self.hit_many([(key, limiter)], now)
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    blocking = False
+    max_keys = 100_000
+
+    def __init__(self):
+        self._states = {}  # key -> (expires_at, state)
+        self._lock = threading.Lock()
+
+    def hit_many(self, entries, now):
+        with self._lock:
+            states = []
+            for key, _ in entries:
+                expires_at, state = self._states.get(key, (0, None))
+                states.append(state if expires_at > now else None)
+            new_states, wait = _apply([limiter for _, limiter in entries], states, now)
+            if new_states is not None:
+                if len(self._states) >= self.max_keys:
+                    self._states = {k: v for k, v in self._states.items() if v[0] > now}
+                for (key, limiter), state in zip(entries, new_states):
+                    self._states[key] = (now + 2 * limiter.period, state)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+
+def _encode(state):
+    return ",".join(repr(float(v)) for v in state)
+
+
+def _decode(value):
+    return tuple(float(v) for v in value.split(",")) if value else None
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread, reopened after a fork (gunicorn preload).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit_many(self, entries, now):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            states, new_keys = [], False
+            for key, _ in entries:
+                row = conn.execute("SELECT state, expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                states.append(_decode(row[0]) if row and row[1] > now else None)
+                new_keys = new_keys or row is None
+            new_states, wait = _apply([limiter for _, limiter in entries], states, now)
+            if new_states is not None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limits (key, state, expires_at) VALUES (?, ?, ?)",
+                    [(key, _encode(state), now + 2 * limiter.period) for (key, limiter), state in zip(entries, new_states)],
+                )
+            if new_keys and hash(entries[0][0]) % 100 == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at < ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def clear(self):
+        self._conn().execute("DELETE FROM rate_limits")
+
+
+class RedisRateLimitStore(RateLimitStore):
+    key_prefix = "app404:rl:"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RATE_LIMIT_STORE_URL uses redis:// but the `redis` package is not installed.")
+        self._client = redis.Redis.from_url(url)
+
+    def hit_many(self, entries, now):
+        keys = [self.key_prefix + key for key, _ in entries]
+        result = []
+
+        def update(pipe):
+            states = [_decode((value or b"").decode()) for value in pipe.mget(keys)]
+            new_states, wait = _apply([limiter for _, limiter in entries], states, now)
+            pipe.multi()
+            if new_states is not None:
+                for key, (_, limiter), state in zip(keys, entries, new_states):
+                    pipe.set(key, _encode(state), px=int(2 * limiter.period * 1000))
+            result[:] = [wait]
+
+        # Optimistic transaction: retried if another worker wrote a key meanwhile.
+        self._client.transaction(update, *keys)
+        return result[0]
+
+    def clear(self):
+        for key in self._client.scan_iter(self.key_prefix + "*"):
+            self._client.delete(key)
+
+
+def store_from_url(url: str) -> RateLimitStore:
+    if url == "memory://":
+        return MemoryRateLimitStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteRateLimitStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRateLimitStore(url)
+    raise ImproperlyConfigured(f"Unsupported RATE_LIMIT_STORE_URL: {url}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> RateLimitStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = store_from_url(settings.RATE_LIMIT_STORE_URL)
+    return _store
+
+
+_prefix_rules = (None, ())  # (RATE_LIMITS it was built from, rules)
+
+
+def rules_for(request, view_func):
+    """The view's own rules followed by those of matching RATE_LIMITS prefixes."""
+    global _prefix_rules
+    configured, rules = _prefix_rules
+    if configured is not settings.RATE_LIMITS:
+        rules = tuple(
+            (prefix, Rule(scope=f"prefix:{prefix}", **spec))
+            for prefix, specs in settings.RATE_LIMITS.items() for spec in specs
+        )
+        _prefix_rules = (settings.RATE_LIMITS, rules)
+    path = request.path_info
+    return (*getattr(view_func, "rate_limits", ()), *(rule for prefix, rule in rules if path.startswith(prefix)))
+
+
+def too_many_requests(request, retry_after):
+    resp = JsonResponse({"error": "Too many requests, please retry later", "retry_after": retry_after}, status=429)
+    resp["Retry-After"] = str(retry_after)
+    return resp
+
+
+def check(request, rules, throttled=None):
+    """
+    A 429 response if any rule is exhausted for this request, else None.
+    `throttled(request, retry_after)` builds it (default: JSON).
+    """
+    request._rate_limits_checked = True
+    if not settings.RATE_LIMIT_ENABLED or not rules:
+        return None
+    entries = []
+    for rule in rules:
+        bucket = rule.bucket(request)
+        if bucket is not None:
+            entries.append((bucket, rule.limiter))
+    wait = get_store().hit_many(entries, time.time()) if entries else 0.0
+    if not wait:
+        return None
+    return (throttled or too_many_requests)(request, max(1, math.ceil(wait)))
+
+
+async def acheck(request, rules, throttled=None):
+    """Async version of check(); blocking stores run in a thread."""
+    if get_store().blocking and settings.RATE_LIMIT_ENABLED and rules:
+        return await sync_to_async(check, thread_sensitive=False)(request, rules, throttled)
+    return check(request, rules, throttled)
+
+
+def throttled_response(view_func):
+    """The view's `throttled` callable from @rate_limit, if any."""
+    return getattr(view_func, "rate_limit_throttled", None)
+
+
+def rate_limit(rate, key="user_or_ip", algorithm="token_bucket", scope=None, methods=(), throttled=None):
+    """
+    Limit a view to `rate` hits per key. Stack several for several limits;
+    async views stay async.
+    """
+    def decorator(view_func):
+        rule = Rule(rate, key, algorithm, scope=scope or f"{view_func.__module__}.{view_func.__qualname__}",
+                    methods=tuple(methods))
+        rules = (*getattr(view_func, "rate_limits", ()), rule)
+        respond = throttled or throttled_response(view_func)
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async(request, *args, **kwargs):
+                if not getattr(request, "_rate_limits_checked", False):
+                    response = await acheck(request, rules, respond)
+                    if response is not None:
+                        return response
+                return await view_func(request, *args, **kwargs)
+            wrapped = _wrapped_async
+        else:
+            @wraps(view_func)
+            def _wrapped(request, *args, **kwargs):
+                if not getattr(request, "_rate_limits_checked", False):
+                    response = check(request, rules, respond)
+                    if response is not None:
+                        return response
+                return view_func(request, *args, **kwargs)
+            wrapped = _wrapped
+        wrapped.rate_limits = rules
+        wrapped.rate_limit_throttled = respond
+        return wrapped
+    return decorator
+
+
+def reset():
+    get_store().clear()
@@ -0,0 +1,98 @@
+"""
+Readiness probe for load balancers: every database alias (or those in
+READINESS_DATABASES) answers a query.
+
+Each alias is probed on its own thread, all at once, and gets
+READINESS_PROBE_TIMEOUT seconds; a probe still stuck from an earlier check
+counts as timed out rather than piling up another thread. The probe reads
+django_migrations, so a missing or empty database file (a lost volume)
+fails too, not only an unreachable server.
+
+The result is shared for READINESS_CACHE_SECONDS so frequent health checks
+don't multiply database load. Readiness fails (503) when an alias in
+READINESS_CRITICAL_DATABASES is down; other aliases only make it
+"degraded".
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+_lock = threading.Lock()
+_pool = None
+_inflight = {}  # alias -> Future of a probe that hasn't finished yet
+_cached = (0.0, None)  # (expires_at, report)
+
+
+def _probe(alias):
+    conn = connections[alias]
+    conn.close_if_unusable_or_obsolete()
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM django_migrations LIMIT 1")
+        cursor.fetchall()
+    return time.perf_counter() - started
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=len(settings.DATABASES), thread_name_prefix="readiness")
+    return _pool
+
+
+def check() -> dict:
+    """Probe every alias now (no caching)."""
+    pool = _get_pool()
+    futures = {}
+    for alias in settings.READINESS_DATABASES or settings.DATABASES:
+        future = _inflight.get(alias)
+        if future is None or future.done():
+            future = _inflight[alias] = pool.submit(_probe, alias)
+        futures[alias] = future
+    wait(futures.values(), timeout=settings.READINESS_PROBE_TIMEOUT)
+
+    critical = set(settings.READINESS_CRITICAL_DATABASES)
+    databases = {}
+    for alias, future in futures.items():
+        entry = {"ok": False, "critical": alias in critical}
+        if not future.done():
+            entry["error"] = "timeout"
+        elif future.exception() is not None:
+            # Only the class: the endpoint is public and messages can hold paths or hosts.
+            entry["error"] = type(future.exception()).__name__
+        else:
+            entry["ok"] = True
+            entry["latency_ms"] = round(future.result() * 1000, 2)
+        databases[alias] = entry
+
+    failed = {alias for alias, entry in databases.items() if not entry["ok"]}
+    if failed & critical:
+        status = "unavailable"
+    elif failed:
+        status = "degraded"
+    else:
+        status = "ok"
+    return {"status": status, "databases": databases}
+
+
+def cached_check() -> tuple:
+    """(report, age in seconds) from the last check younger than READINESS_CACHE_SECONDS, or a new one."""
+    global _cached
+    with _lock:
+        expires_at, report = _cached
+        now = time.monotonic()
+        if report is None or now >= expires_at:
+            report = check()
+            expires_at = now + settings.READINESS_CACHE_SECONDS
+            _cached = (expires_at, report)
+        return report, round(settings.READINESS_CACHE_SECONDS - (expires_at - now), 3)
+
+
+def reset():
+    global _cached
+    with _lock:
+        _cached = (0.0, None)
+        _inflight.clear()
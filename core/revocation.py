@@ -0,0 +1,156 @@
+"""
+Shared store of per-user token-version epochs.
+
+The epoch of a user is the token_version their tokens must carry (REVOKED
+once the user is deactivated or deleted). User saves write it through, so
+every worker and replica pointing at the same store rejects revoked tokens
+without reading the users table. Users the store hasn't seen yet fall back
+to the database once and are then seeded.
+
+Selected with JWT_REVOCATION_URL:
+
+    (empty)                 disabled; token_version is checked in the database
+    memory://               per-process dict (single worker / tests)
+    sqlite:////path/db      shared by all workers on one host (default)
+    redis://host:6379/0     shared by all replicas (needs the `redis` package)
+
+Without a store the per-process user cache is bypassed too, since nothing
+would tell it about revocations made by other workers.
+"""
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+REVOKED = -1
+
+
+class RevocationStore:
+    # Whether calls do I/O; async callers run blocking stores in a thread.
+    blocking = True
+    # Whether revocations are tracked at all; the user cache relies on it.
+    enabled = True
+
+    def get(self, user_id):
+        """Return the user's epoch, or None if unknown."""
+        raise NotImplementedError
+
+    def set(self, user_id, epoch: int):
+        raise NotImplementedError
+
+    def seed(self, user_id, epoch: int):
+        """Record an epoch read from the database unless one is already stored."""
+        raise NotImplementedError
+
+
+class NullRevocationStore(RevocationStore):
+    blocking = False
+    enabled = False
+
+    def get(self, user_id):
+        return None
+
+    def set(self, user_id, epoch):
+        pass
+
+    def seed(self, user_id, epoch):
+        pass
+
+
+class MemoryRevocationStore(RevocationStore):
+    blocking = False
+
+    def __init__(self):
+        self._epochs = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return self._epochs.get(str(user_id))
+
+    def set(self, user_id, epoch):
+        with self._lock:
+            self._epochs[str(user_id)] = epoch
+
+    def seed(self, user_id, epoch):
+        with self._lock:
+            self._epochs.setdefault(str(user_id), epoch)
+
+
+class SQLiteRevocationStore(RevocationStore):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread, reopened after a fork (gunicorn preload).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS token_epochs (user_id TEXT PRIMARY KEY, epoch INTEGER NOT NULL)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, user_id):
+        row = self._conn().execute("SELECT epoch FROM token_epochs WHERE user_id = ?", (str(user_id),)).fetchone()
+        return row[0] if row else None
+
+    def set(self, user_id, epoch):
+        self._conn().execute("INSERT OR REPLACE INTO token_epochs (user_id, epoch) VALUES (?, ?)", (str(user_id), epoch))
+
+    def seed(self, user_id, epoch):
+        self._conn().execute("INSERT OR IGNORE INTO token_epochs (user_id, epoch) VALUES (?, ?)", (str(user_id), epoch))
+
+
+class RedisRevocationStore(RevocationStore):
+    key_prefix = "app404:tv:"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("JWT_REVOCATION_URL uses redis:// but the `redis` package is not installed.")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, user_id):
+        value = self._client.get(self.key_prefix + str(user_id))
+        return int(value) if value is not None else None
+
+    def set(self, user_id, epoch):
+        self._client.set(self.key_prefix + str(user_id), epoch)
+
+    def seed(self, user_id, epoch):
+        self._client.set(self.key_prefix + str(user_id), epoch, nx=True)
+
+
+def store_from_url(url: str) -> RevocationStore:
+    if not url:
+        return NullRevocationStore()
+    if url == "memory://":
+        return MemoryRevocationStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteRevocationStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRevocationStore(url)
+    raise ImproperlyConfigured(f"Unsupported JWT_REVOCATION_URL: {url}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> RevocationStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = store_from_url(settings.JWT_REVOCATION_URL)
+    return _store
+
+
+def user_epoch(user) -> int:
+    return user.token_version if user.is_active else REVOKED
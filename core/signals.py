@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.revocation import REVOKED, get_store, user_epoch
+from core.user_cache import user_cache
+from core.users import forget_user
+
+
+# Saves limited to other fields (last_login, password upgrades) may come from
+# an instance loaded before a logout; publishing its epoch would revive
+# revoked tokens.
+_EPOCH_FIELDS = {"token_version", "is_active"}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def publish_user_epoch(sender, instance, update_fields=None, **kwargs):
+    # token_version bumps (logout) and deactivation both go through save().
+    # Bulk QuerySet.update() bypasses this; the cache TTL covers that case.
+    if update_fields is None or _EPOCH_FIELDS & set(update_fields):
+        get_store().set(instance.pk, user_epoch(instance))
+    user_cache.invalidate(instance.pk)
+    forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_deleted_user(sender, instance, **kwargs):
+    get_store().set(instance.pk, REVOKED)
+    user_cache.invalidate(instance.pk)
+    forget_user(instance.pk)
@@ -0,0 +1,53 @@
+"""
+Per-alias SQLite tuning applied when each connection opens.
+
+settings.SQLITE_PRAGMAS maps an alias to {pragma: value}. journal_mode=WAL
+is persistent in the database file; the others are per connection, which is
+why they are set on connection_created rather than once at migrate time.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Values are spliced into PRAGMA statements, so only allow plain words and integers.
+_NAME = re.compile(r"[a-z_]+")
+_VALUE = re.compile(r"-?\w+")
+
+# How SQLite reports some enumerated pragmas when read back.
+READ_BACK = {
+    "synchronous": {0: "off", 1: "normal", 2: "full", 3: "extra"},
+    "temp_store": {0: "default", 1: "file", 2: "memory"},
+}
+
+
+def pragmas_for(alias) -> dict:
+    """Configured pragmas for an alias, without the ones left at SQLite's default."""
+    pragmas = {}
+    for name, value in settings.SQLITE_PRAGMAS.get(alias, {}).items():
+        if value in (None, ""):
+            continue
+        value = str(value).lower()
+        if not _NAME.fullmatch(name) or not _VALUE.fullmatch(value):
+            raise ImproperlyConfigured(f"Invalid SQLite pragma for {alias!r}: {name}={value}")
+        pragmas[name] = value
+    return pragmas
+
+
+def read_pragma(raw_connection, name):
+    """Current value of a pragma, or None where it doesn't apply (mmap_size on :memory:)."""
+    row = raw_connection.execute(f"PRAGMA {name}").fetchone()
+    if row is None:
+        return None
+    return READ_BACK.get(name, {}).get(row[0], row[0])
+
+
+@receiver(connection_created, dispatch_uid="core.sqlite.apply_pragmas")
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    # Use the raw sqlite3 connection: no cursor wrappers or query logging.
+    for name, value in pragmas_for(connection.alias).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
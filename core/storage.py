@@ -0,0 +1,83 @@
+"""
+Static files storage: content-hashed names (served by WhiteNoise with an
+immutable Cache-Control), gzip/brotli variants built by collectstatic, and
+a post-process step that only handles what changed since the last run.
+
+collectstatic already skips copying files that are older than the
+collected copy, but the manifest storage then re-hashes, and WhiteNoise
+re-compresses, every file from all the team static trees. The hash of each
+collected file is kept next to the manifest (staticfiles.sources.json);
+unchanged files keep their manifest entry and compressed variants. CSS and
+JS may reference other files (url(), source maps), so they are processed
+again whenever anything else was added, changed or removed.
+
+`collectstatic --clear` starts over.
+"""
+import json
+
+from django.contrib.staticfiles.utils import matches_patterns
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    sources_name = "staticfiles.sources.json"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sources = None
+        self._kept = {}
+        self._reused = frozenset()
+
+    def stored_name(self, name):
+        # Nothing collected yet (runserver, tests): use the source names.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run=True, **options)
+            return
+
+        previous = self.hashed_files
+        before = self._load_sources()
+        self._sources = {name: self._digest(name) for name in paths}
+        changed = {
+            name for name in paths
+            if before.get(name) != self._sources[name]
+            or name not in previous
+            or not self.exists(previous[name])
+        }
+        adjustable = {name for name in paths if matches_patterns(name, self._patterns)}
+        if changed - adjustable or set(before) - set(paths):
+            changed |= adjustable
+        self._kept = {name: previous[name] for name in paths if name not in changed}
+        self._reused = frozenset(previous.values())
+
+        yield from super().post_process({name: paths[name] for name in changed}, **options)
+
+    def save_manifest(self):
+        self.hashed_files = {**self._kept, **self.hashed_files}
+        super().save_manifest()
+        if self._sources is not None:
+            if self.manifest_storage.exists(self.sources_name):
+                self.manifest_storage.delete(self.sources_name)
+            self.manifest_storage._save(self.sources_name, ContentFile(json.dumps(self._sources).encode()))
+
+    def compress_files(self, paths):
+        # A hashed name always holds the same content, so variants built for it still apply.
+        return super().compress_files(
+            [path for path in paths if not (path in self._reused and self.exists(f"{path}.gz"))]
+        )
+
+    def _digest(self, name):
+        with self.open(name) as content:
+            return self.file_hash(name, content)
+
+    def _load_sources(self):
+        try:
+            with self.manifest_storage.open(self.sources_name) as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return {}
@@ -0,0 +1,140 @@
+"""
+Test helpers for keeping hot endpoints' database work in check.
+
+QueryBudget counts the queries run inside a block per database alias and
+fails when an alias exceeds its budget (aliases without one get 0). It
+also runs EXPLAIN once per distinct statement and fails when a plan reads
+a whole table, unless that table is listed in allow_scans:
+
+    with QueryBudget({"default": 2, "team9": 2}, allow_scans={"team9_lesson"}) as budget:
+        self.client.get("/team9/api/lessons/")
+    budget.plans  # {(alias, sql): [plan lines]}
+
+Plans are only checked on SQLite, which the test suite runs on.
+
+django.test's clients always run the full settings.MIDDLEWARE chain. Client
+and AsyncClient here go through core.handlers like the WSGI/ASGI entry
+points, so API prefixes get their MIDDLEWARE_PROFILES chain; DiscoverRunner
+(settings.TEST_RUNNER) makes them TestCase's self.client and
+self.async_client.
+"""
+import re
+from contextlib import ExitStack
+
+from django import test as django_test
+from django.db import connections
+from django.test import SimpleTestCase, override_settings, runner
+from django.test.client import AsyncClientHandler, ClientHandler
+
+from core import revocation
+from core.handlers import ProfiledHandlerMixin
+
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+# "SCAN team9_lesson" (SQLite >= 3.36) or "SCAN TABLE team9_lesson"; scans
+# that go through an index or a temp b-tree say "USING ...".
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+class QueryBudget:
+    def __init__(self, budgets, allow_scans=(), explain=True):
+        self.budgets = dict(budgets)
+        self.allow_scans = set(allow_scans)
+        self.explain = explain
+        self.queries = {}  # alias -> [(sql, params)]
+        self.plans = {}  # (alias, sql) -> [plan lines]
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self._recorder(conn.alias)))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stack.close()
+        if exc_type is not None:
+            return False
+        problems = self._over_budget()
+        if self.explain:
+            problems += self._full_scans()
+        if problems:
+            raise AssertionError("\n".join(["Query budget failed:", *problems]))
+        return False
+
+    def _recorder(self, alias):
+        def record(execute, sql, params, many, context):
+            self.queries.setdefault(alias, []).append((sql, None if many else params))
+            return execute(sql, params, many, context)
+        return record
+
+    def _over_budget(self):
+        problems = []
+        for alias, queries in sorted(self.queries.items()):
+            budget = self.budgets.get(alias, 0)
+            if len(queries) > budget:
+                problems.append(f"  {alias}: {len(queries)} queries, budget {budget}")
+                problems.extend(f"    {sql}" for sql, _ in queries)
+        return problems
+
+    def _full_scans(self):
+        problems = []
+        for alias, queries in sorted(self.queries.items()):
+            conn = connections[alias]
+            if conn.vendor != "sqlite":
+                continue
+            distinct = {}
+            for sql, params in queries:
+                if params is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+                    distinct.setdefault(sql, params)
+            for sql, params in distinct.items():
+                with conn.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                    plan = [row[-1] for row in cursor.fetchall()]
+                self.plans[alias, sql] = plan
+                for line in plan:
+                    match = _SQLITE_FULL_SCAN.match(line)
+                    if match and match.group(1) not in self.allow_scans:
+                        problems.append(f"  {alias}: full scan of {match.group(1)} in\n    {sql}")
+        return problems
+
+
+class ProfiledClientHandler(ProfiledHandlerMixin, ClientHandler):
+    pass
+
+
+class ProfiledAsyncClientHandler(ProfiledHandlerMixin, AsyncClientHandler):
+    pass
+
+
+class Client(django_test.Client):
+    """django.test.Client served like production: API prefixes get their MIDDLEWARE_PROFILES chain."""
+
+    def __init__(self, enforce_csrf_checks=False, raise_request_exception=True, *, headers=None, **defaults):
+        super().__init__(enforce_csrf_checks, raise_request_exception, headers=headers, **defaults)
+        self.handler = ProfiledClientHandler(enforce_csrf_checks)
+
+
+class AsyncClient(django_test.AsyncClient):
+    """django.test.AsyncClient served like production, see Client."""
+
+    def __init__(self, enforce_csrf_checks=False, raise_request_exception=True, *, headers=None, **defaults):
+        super().__init__(enforce_csrf_checks, raise_request_exception, headers=headers, **defaults)
+        self.handler = ProfiledAsyncClientHandler(enforce_csrf_checks)
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._client_classes = SimpleTestCase.client_class, SimpleTestCase.async_client_class
+        SimpleTestCase.client_class, SimpleTestCase.async_client_class = Client, AsyncClient
+        # Test users reuse ids of real ones: keep their epochs out of the
+        # host's shared revocation store.
+        self._revocation = override_settings(JWT_REVOCATION_URL="memory://")
+        self._revocation.enable()
+        revocation._store = None
+
+    def teardown_test_environment(self, **kwargs):
+        revocation._store = None
+        self._revocation.disable()
+        SimpleTestCase.client_class, SimpleTestCase.async_client_class = self._client_classes
+        super().teardown_test_environment(**kwargs)
@@ -1,5 +1,44 @@
-from django.test import TestCase
+import datetime
+import decimal
+import gzip
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import jwt
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase
+from django.urls import path, resolve, reverse
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse as DjangoJsonResponse
+from django.template import RequestContext, Template
+
+from core import db_router, fastjson, hashing, metrics, profiling, ratelimit, readiness, revocation, views, web_auth_views
+from core.cache import cache_page_per_user
+from core.handlers import ProfiledWSGIHandler
+from core.lazy_urls import lazy_include
+from core.jwt_utils import create_access_token
+from core.middleware import CompressionMiddleware, ReplicaPinMiddleware, brotli
+from core.sqlite import pragmas_for, read_pragma
+from core.testing import AsyncClient, Client, ProfiledClientHandler, QueryBudget
+from core.users import resolve_users
+from core.user_cache import user_cache
 
 User = get_user_model()
 
@@ -22,3 +61,1010 @@ class AuthFlowTests(TestCase):
         # logout
         res3 = self.client.post("/api/auth/logout/", data="{}", content_type="application/json")
         self.assertEqual(res3.status_code, 200)
+
+
+class TokenUserCacheTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.client.post(
+            "/api/auth/signup/",
+            data='{"email":"c@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+
+    def test_repeat_requests_skip_user_query(self):
+        self.client.get("/api/auth/me/")
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/auth/me/")
+        self.assertEqual(res.status_code, 200)
+
+    def test_logout_invalidates_cached_user(self):
+        access = self.client.cookies["access_token"].value
+        self.client.get("/api/auth/me/")
+        self.client.post("/api/auth/logout/", data="{}", content_type="application/json")
+
+        self.client.cookies["access_token"] = access
+        res = self.client.get("/api/auth/me/")
+        self.assertEqual(res.status_code, 401)
+
+    def test_deactivation_invalidates_cached_user(self):
+        self.client.get("/api/auth/me/")
+        user = User.objects.get(email="c@test.com")
+        user.is_active = False
+        user.save()
+
+        res = self.client.get("/api/auth/me/")
+        self.assertEqual(res.status_code, 401)
+
+    def test_user_is_resolved_lazily(self):
+        user_cache.clear()
+        self.assertIn("access_token", self.client.cookies)
+        # Authenticated (not in JWT_ANONYMOUS_PATHS), but the view never reads request.user.
+        self.assertFalse(any("/api/auth/jwks/".startswith(p) for p in settings.JWT_ANONYMOUS_PATHS))
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/auth/jwks/")
+        self.assertEqual(res.status_code, 200)
+
+        with self.assertNumQueries(1):
+            res = self.client.get("/api/auth/me/")
+        self.assertEqual(res.status_code, 200)
+
+
+class AsymmetricTokenTests(TestCase):
+    def setUp(self):
+        self.keys_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.keys_dir.cleanup)
+        settings_cm = self.settings(
+            JWT_ALGORITHM="RS256", JWT_KEYS_DIR=Path(self.keys_dir.name), JWT_ACCEPT_HS256=False
+        )
+        settings_cm.enable()
+        self.addCleanup(settings_cm.disable)
+        call_command("rotate_jwt_key", stdout=StringIO())
+
+    def test_tokens_verify_against_published_jwks(self):
+        self.client.post(
+            "/api/auth/signup/",
+            data='{"email":"k@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        token = self.client.cookies["access_token"].value
+        keys = self.client.get("/api/auth/jwks/").json()["keys"]
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(jwt.get_unverified_header(token)["kid"], keys[0]["kid"])
+
+        public_key = jwt.PyJWK(keys[0]).key
+        payload = jwt.decode(token, public_key, algorithms=["RS256"])
+        self.assertEqual(payload["email"], "k@test.com")
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+
+    def test_rotation_keeps_old_tokens_valid(self):
+        self.client.post(
+            "/api/auth/signup/",
+            data='{"email":"r@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        old_kid = jwt.get_unverified_header(self.client.cookies["access_token"].value)["kid"]
+        time.sleep(1)
+        call_command("rotate_jwt_key", "--stage", stdout=StringIO())
+
+        # Published before it signs anything.
+        self.assertEqual(len(self.client.get("/api/auth/jwks/").json()["keys"]), 2)
+        self.client.post("/api/auth/refresh/")
+        self.assertEqual(jwt.get_unverified_header(self.client.cookies["access_token"].value)["kid"], old_kid)
+        with self.assertRaisesMessage(CommandError, "cached JWKS"):
+            call_command("rotate_jwt_key", "--activate", stdout=StringIO())
+
+        with self.settings(JWT_JWKS_MAX_AGE=0):
+            call_command("rotate_jwt_key", "--activate", stdout=StringIO())
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+        self.client.post("/api/auth/refresh/")
+        self.assertNotEqual(jwt.get_unverified_header(self.client.cookies["access_token"].value)["kid"], old_kid)
+        self.assertEqual(len(self.client.get("/api/auth/jwks/").json()["keys"]), 2)
+
+
+class AuthSubrequestTests(TestCase):
+    def test_check_returns_cacheable_user_headers(self):
+        self.client.post(
+            "/api/auth/signup/",
+            data='{"email":"s@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        res = self.client.get("/api/auth/check/")
+        self.assertEqual(res.status_code, 204)
+        self.assertEqual(res["X-User-Email"], "s@test.com")
+        self.assertRegex(res["Cache-Control"], r"^public, max-age=\d+$")
+        self.assertIn("Expires", res)
+        self.assertEqual(len(res["X-Auth-Cache-Key"]), 64)
+        self.assertNotIn("csrftoken", res.cookies)
+
+    def test_check_without_token_is_not_cached(self):
+        res = self.client.get("/api/auth/check/")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res["Cache-Control"], "no-store")
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(email="h@test.com", password="pass1234")
+
+    def _login(self):
+        return self.client.post(
+            "/api/auth/login/",
+            data='{"email":"h@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+
+    def test_login_upgrades_hash_to_preferred_hasher(self):
+        hashers = [
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        ]
+        with self.settings(PASSWORD_HASHERS=hashers):
+            self.assertEqual(self._login().status_code, 200)
+        self.assertTrue(User.objects.get(email="h@test.com").password.startswith("md5$"))
+
+    def test_full_queue_sheds_with_retry_after(self):
+        busy = hashing.HashingExecutor(workers=0, queue_depth=0)
+        busy._slots.acquire()
+        with mock.patch.object(hashing, "executor", busy):
+            res = self._login()
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res["Retry-After"], "2")
+        self.assertEqual(busy.stats()["rejected"], 1)
+
+    async def test_hashing_views_are_async_and_shed(self):
+        busy = hashing.HashingExecutor(workers=0, queue_depth=0)
+        busy._slots.acquire()
+        client = AsyncClient()
+        form = {"email": "h@test.com", "password": "pass1234"}
+        with mock.patch.object(hashing, "executor", busy):
+            for view in (views.signup_api, web_auth_views.login_page, web_auth_views.signup_page):
+                self.assertTrue(iscoroutinefunction(view), view.__name__)
+            self.assertEqual((await client.post("/auth/", form)).status_code, 503)
+            self.assertEqual((await client.post("/auth/signup/", {**form, "email": "new@test.com"})).status_code, 503)
+        self.assertEqual(busy.stats()["rejected"], 2)
+
+    def test_password_login_needs_model_backend(self):
+        self.assertIsNotNone(hashing.authenticate("h@test.com", "pass1234"))
+        with self.settings(AUTHENTICATION_BACKENDS=["core.tests.NoLoginBackend"]):
+            self.assertIsNone(hashing.authenticate("h@test.com", "pass1234"))
+            self.assertEqual(self._login().status_code, 401)
+
+    def test_process_pool_hashes_and_checks(self):
+        pool = hashing.HashingExecutor(workers=1, queue_depth=1)
+        self.addCleanup(lambda: pool._pool and pool._pool.shutdown())
+        encoded = pool.run(hashing._make, "pass1234")
+        valid, upgraded = pool.run(hashing._check, "pass1234", encoded)
+        self.assertTrue(valid)
+        self.assertIsNone(upgraded)
+        self.assertEqual(pool.stats()["completed"], 2)
+
+
+class NoLoginBackend:
+    def authenticate(self, request, **credentials):
+        return None
+
+
+class ImportUsersCommandTests(TestCase):
+    def _import(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command("import_users", f.name, "--workers", "0", *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_csv_import_skips_existing_and_duplicate_emails(self):
+        User.objects.create_user(email="old@test.com", password="pass1234", first_name="Old")
+        out = self._import(
+            "email,password,first_name,last_name,age\n"
+            "New@Test.com,pass1234,N,U,21\n"
+            "old@test.com,other,Changed,,\n"
+            "new@test.com,again,,,\n"
+            "not-an-email,x,,,\n"
+            "young@test.com,x,,,-3\n",
+            ".csv",
+        )
+        self.assertIn("created 1, updated 0, skipped 2, invalid 2", out)
+        new = User.objects.get(email="new@test.com")
+        self.assertTrue(new.check_password("pass1234"))
+        self.assertEqual(new.age, 21)
+        self.assertEqual(User.objects.get(email="old@test.com").first_name, "Old")
+
+    def test_jsonl_import_can_update_existing(self):
+        user = User.objects.create_user(email="old@test.com", password="pass1234")
+        token = create_access_token(user)
+        store = revocation.MemoryRevocationStore()
+        with mock.patch.object(revocation, "_store", store):
+            self.assertEqual(self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 200)
+            out = self._import(
+                '{"email": "old@test.com", "password": "newpass99", "first_name": "Up"}\n'
+                '{"email": "b@test.com", "password": "pass1234"}\n'
+                '["c@test.com", "pass1234"]\n',
+                ".jsonl",
+                "--on-conflict", "update",
+            )
+            self.assertIn("created 1, updated 1, skipped 0, invalid 1", out)
+            old = User.objects.get(email="old@test.com")
+            self.assertEqual(old.first_name, "Up")
+            self.assertTrue(old.check_password("newpass99"))
+            # The old password's tokens stop working, cached user or not.
+            self.assertEqual(store.get(old.pk), user.token_version + 1)
+            self.assertEqual(self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 401)
+
+    def test_update_without_password_keeps_it_and_its_tokens(self):
+        user = User.objects.create_user(email="keep@test.com", password="pass1234", first_name="Old")
+        token = create_access_token(user)
+        out = self._import("email,first_name\nkeep@test.com,New\n", ".csv", "--on-conflict", "update")
+        self.assertIn("updated 1", out)
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, "New")
+        self.assertTrue(user.check_password("pass1234"))
+        self.assertEqual(user.token_version, 0)
+        self.assertEqual(self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {token}").json()["user"]["first_name"], "New")
+
+    def test_rows_with_non_string_fields_are_invalid(self):
+        out = self._import(
+            '{"email": "n1@test.com", "password": 1234}\n'
+            '{"email": "n2@test.com", "first_name": ["A"]}\n'
+            '{"email": 5}\n'
+            '{"email": "ok@test.com", "password": "pass1234", "last_name": "Fine"}\n',
+            ".jsonl",
+        )
+        self.assertIn("created 1, updated 0, skipped 0, invalid 3", out)
+
+
+class RevocationStoreTests(TestCase):
+    def test_without_a_store_the_user_cache_is_bypassed(self):
+        user = User.objects.create_user(email="nostore@test.com", password="pass1234")
+        token = create_access_token(user)
+        user_cache.clear()
+        with mock.patch.object(revocation, "_store", revocation.NullRevocationStore()):
+            self.assertEqual(self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 200)
+            self.assertEqual(user_cache.stats()["size"], 0)
+            # A logout handled by another worker: no signal reaches this process.
+            User.objects.filter(pk=user.pk).update(token_version=F("token_version") + 1)
+            self.assertEqual(self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 401)
+
+    def test_remote_revocation_rejects_cached_user_without_queries(self):
+        store = revocation.MemoryRevocationStore()
+        user_cache.clear()
+        with mock.patch.object(revocation, "_store", store):
+            self.client.post(
+                "/api/auth/signup/",
+                data='{"email":"v@test.com","password":"pass1234"}',
+                content_type="application/json",
+            )
+            user = User.objects.get(email="v@test.com")
+            self.assertEqual(store.get(user.pk), 0)
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+
+            # Logout handled by another worker/replica: only the shared store knows.
+            store.set(user.pk, 1)
+            with self.assertNumQueries(0):
+                res = self.client.get("/api/auth/me/")
+            self.assertEqual(res.status_code, 401)
+
+    def test_worker_with_an_older_epoch_accepts_newer_tokens(self):
+        worker_a, worker_b = revocation.MemoryRevocationStore(), revocation.MemoryRevocationStore()
+        user_cache.clear()
+        login = '{"email":"w@test.com","password":"pass1234"}'
+        with mock.patch.object(revocation, "_store", worker_a):
+            self.client.post("/api/auth/signup/", data=login, content_type="application/json")
+        user = User.objects.get(email="w@test.com")
+        old_access = self.client.cookies["access_token"].value
+        with mock.patch.object(revocation, "_store", worker_b):
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+        self.assertEqual(worker_b.get(user.pk), 0)
+
+        # Logout and a new login both handled by worker A.
+        with mock.patch.object(revocation, "_store", worker_a):
+            self.client.post("/api/auth/logout/", data="{}", content_type="application/json")
+            self.client.post("/api/auth/login/", data=login, content_type="application/json")
+
+        with mock.patch.object(revocation, "_store", worker_b):
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+            self.assertEqual(worker_b.get(user.pk), 1)
+            self.client.cookies["access_token"] = old_access
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+
+    def test_saves_of_other_fields_do_not_publish_a_stale_epoch(self):
+        store = revocation.MemoryRevocationStore()
+        with mock.patch.object(revocation, "_store", store):
+            user = User.objects.create_user(email="stale@test.com", password="pass1234")
+            stale = User.objects.get(pk=user.pk)
+            user.token_version += 1
+            user.save(update_fields=["token_version"])
+            stale.save(update_fields=["last_login"])
+            self.assertEqual(store.get(user.pk), 1)
+
+    def test_sqlite_store_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{tmp}/epochs.sqlite3"
+            a = revocation.store_from_url(url)
+            b = revocation.store_from_url(url)
+            self.assertIsNone(b.get("u1"))
+            a.seed("u1", 3)
+            b.seed("u1", 2)
+            self.assertEqual(b.get("u1"), 3)
+            b.set("u1", revocation.REVOKED)
+            self.assertEqual(a.get("u1"), revocation.REVOKED)
+
+
+class MiddlewareProfileTests(TestCase):
+    def test_api_prefixes_use_the_stateless_chain(self):
+        handler = ProfiledWSGIHandler()
+        factory = RequestFactory()
+
+        page = handler.get_response(factory.get("/team1/"))
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("X-Frame-Options", page)
+
+        api = handler.get_response(factory.get("/api/auth/me/", HTTP_COOKIE="sessionid=abcdefgh1234"))
+        self.assertEqual(api.status_code, 401)
+        self.assertNotIn("X-Frame-Options", api)
+
+    def test_test_client_uses_the_api_chain_which_ignores_sessions(self):
+        self.assertIsInstance(self.client.handler, ProfiledClientHandler)
+        staff = User.objects.create_user(email="chain@test.com", password="pass1234", is_staff=True)
+        self.client.force_login(staff)
+        self.assertNotIn("X-Frame-Options", self.client.get("/api/health/"))
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.client.cookies["access_token"] = create_access_token(staff)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 200)
+
+
+class AsyncAuthTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        User.objects.create_user(email="as@test.com", password="pass1234", first_name="As")
+        self.async_client = AsyncClient()
+
+    def test_auth_views_stay_coroutines(self):
+        for view in (views.login_api, views.refresh_api, views.me, views.verify, views.health):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+        self.assertTrue(views.login_api.csrf_exempt)
+
+    async def test_login_me_refresh(self):
+        res = await self.async_client.post(
+            "/api/auth/login/",
+            data='{"email":"as@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 200)
+
+        res = await self.async_client.get("/api/auth/me/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["user"]["first_name"], "As")
+
+        res = await self.async_client.get("/api/auth/verify/")
+        self.assertEqual(res["X-User-Email"], "as@test.com")
+
+        res = await self.async_client.post("/api/auth/refresh/")
+        self.assertEqual(res.status_code, 200)
+
+    async def test_anonymous_and_wrong_method(self):
+        self.assertEqual((await self.async_client.get("/api/auth/me/")).status_code, 401)
+        self.assertEqual((await self.async_client.get("/api/auth/login/")).status_code, 405)
+        self.assertEqual((await self.async_client.get("/api/health/")).json(), {"status": "ok"})
+
+    async def test_bad_password_is_rejected(self):
+        res = await self.async_client.post(
+            "/api/auth/login/",
+            data='{"email":"as@test.com","password":"wrong"}',
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 401)
+
+
+class LazyTeamURLsTests(TestCase):
+    def setUp(self):
+        self.lazy = lazy_include("team11/", "team11.urls")
+        self.urlconf = type("LazyRoot", (), {"urlpatterns": [path("", views.health, name="lazy-home"), self.lazy]})
+
+    def test_urlconf_loads_on_first_request_under_prefix(self):
+        self.assertEqual(reverse("lazy-home", urlconf=self.urlconf), "/")
+        self.assertEqual(resolve("/", urlconf=self.urlconf).url_name, "lazy-home")
+        self.assertEqual(self.lazy.check(), [])
+        self.assertFalse(self.lazy.loaded)
+
+        self.assertEqual(resolve("/team11/", urlconf=self.urlconf).url_name, "team11_home")
+        self.assertTrue(self.lazy.loaded)
+        self.assertEqual(reverse("team11_home", urlconf=self.urlconf), "/team11/")
+
+
+class MigrateAllCommandTests(TestCase):
+    def _run(self):
+        out = StringIO()
+        done = subprocess.CompletedProcess(args=[], returncode=0, stdout="", stderr="")
+        with mock.patch("subprocess.run", return_value=done) as run:
+            call_command("migrate_all", database=["default"], stdout=out)
+        return out.getvalue(), run
+
+    def test_up_to_date_alias_is_skipped(self):
+        out, run = self._run()
+        self.assertIn("default: up to date", out)
+        run.assert_not_called()
+
+    def test_pending_alias_is_migrated(self):
+        MigrationRecorder.Migration.objects.filter(app="core").delete()
+        out, run = self._run()
+        self.assertIn("default: 1 pending", out)
+        self.assertIn("default: migrated in", out)
+        self.assertEqual(run.call_args.args[0][2:], ["migrate", "--database", "default", "--noinput", "--skip-checks"])
+
+
+class DBConnectionStatsTests(TestCase):
+    def test_requests_reuse_the_open_connection(self):
+        User.objects.create_superuser(email="ops@test.com", password="pass1234")
+        self.client.post(
+            "/api/auth/login/",
+            data='{"email":"ops@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        before = self.client.get("/api/db/connections/").json()["aliases"]["default"]["reused"]
+        user_cache.clear()
+        res = self.client.get("/api/db/connections/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["aliases"]["default"]["reused"], before + 1)
+
+    def test_staff_only(self):
+        User.objects.create_user(email="plain@test.com", password="pass1234")
+        self.client.post(
+            "/api/auth/login/",
+            data='{"email":"plain@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        self.assertEqual(self.client.get("/api/db/connections/").status_code, 403)
+
+
+class SQLitePragmaTests(TestCase):
+    def test_profile_is_applied_on_connect(self):
+        connection.ensure_connection()
+        self.assertEqual(read_pragma(connection.connection, "synchronous"), "normal")
+        self.assertEqual(read_pragma(connection.connection, "busy_timeout"), 5000)
+        self.assertEqual(read_pragma(connection.connection, "temp_store"), "memory")
+
+    def test_overrides_and_validation(self):
+        with self.settings(SQLITE_PRAGMAS={"default": {"synchronous": "FULL", "mmap_size": ""}}):
+            self.assertEqual(pragmas_for("default"), {"synchronous": "full"})
+        with self.settings(SQLITE_PRAGMAS={"default": {"synchronous": "full; DROP TABLE x"}}):
+            with self.assertRaises(ImproperlyConfigured):
+                pragmas_for("default")
+
+    def test_diagnostics_command(self):
+        out = StringIO()
+        call_command("sqlite_pragmas", database=["default"], stdout=out, stderr=StringIO())
+        self.assertIn("busy_timeout   5000", out.getvalue())
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        from team9.models import Lesson
+
+        self.Lesson = Lesson
+        settings_cm = self.settings(DATABASE_REPLICAS={"team9": ["team9_replica1"]})
+        settings_cm.enable()
+        self.addCleanup(settings_cm.disable)
+        self.router = db_router.TeamPerAppRouter()
+
+    def test_reads_use_replicas_until_the_request_writes(self):
+        self.assertEqual(self.router.db_for_read(User), None)
+        token = db_router.begin_request()
+        try:
+            self.assertEqual(self.router.db_for_read(self.Lesson), "team9_replica1")
+            self.assertEqual(self.router.db_for_write(self.Lesson), "team9")
+            self.assertEqual(self.router.db_for_read(self.Lesson), "team9")
+        finally:
+            self.assertEqual(db_router.end_request(token), {"team9"})
+
+    def test_background_scope_pins_sticky_aliases_and_ends(self):
+        @db_router.scope(sticky={"team9"})
+        def task():
+            self.assertEqual(self.router.db_for_read(self.Lesson), "team9")
+
+        def worker():
+            task()
+            with db_router.scope():
+                self.router.db_for_write(self.Lesson)
+            # Neither scope's pins outlive it in this thread.
+            return self.router.db_for_read(self.Lesson)
+
+        thread_result = []
+        thread = threading.Thread(target=lambda: thread_result.append(worker()))
+        thread.start()
+        thread.join()
+        self.assertEqual(thread_result, ["team9_replica1"])
+
+    def test_replicas_are_never_migrated_and_relate_to_their_primary(self):
+        self.assertFalse(self.router.allow_migrate("team9_replica1", "team9"))
+        self.assertTrue(self.router.allow_migrate("team9", "team9"))
+        from_replica, from_primary = self.Lesson(), self.Lesson()
+        from_replica._state.db, from_primary._state.db = "team9_replica1", "team9"
+        self.assertTrue(self.router.allow_relation(from_replica, from_primary))
+
+    def test_middleware_keeps_writers_on_the_primary(self):
+        def view(request):
+            self.router.db_for_write(self.Lesson)
+            return HttpResponse()
+
+        res = ReplicaPinMiddleware(view)(RequestFactory().post("/team9/api/lessons/"))
+        self.assertEqual(res.cookies["db_pin"].value, "team9")
+
+        def read_view(request):
+            return HttpResponse(self.router.db_for_read(self.Lesson))
+
+        request = RequestFactory().get("/team9/api/lessons/")
+        request.COOKIES["db_pin"] = "team9"
+        self.assertEqual(ReplicaPinMiddleware(read_view)(request).content, b"team9")
+        self.assertEqual(ReplicaPinMiddleware(read_view)(RequestFactory().get("/")).content, b"team9_replica1")
+
+
+class ResolveUsersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(email=f"u{i}@test.com", first_name=f"U{i}", last_name="Test")
+            for i in range(30)
+        ]
+
+    def test_one_query_then_cached(self):
+        ids = [u.id for u in self.users] + ["not-a-uuid"]
+        with self.assertNumQueries(1):
+            users = resolve_users(ids)
+        self.assertEqual(len(users), 30)
+        self.assertEqual(users[self.users[0].id]["display_name"], "U0 Test")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_users([str(self.users[1].id)])[str(self.users[1].id)]["email"], "u1@test.com")
+
+    def test_saving_a_user_refreshes_its_entry(self):
+        user = self.users[0]
+        resolve_users([user.id])
+        user.first_name = "Renamed"
+        user.save()
+        self.assertEqual(resolve_users([user.id])[user.id]["first_name"], "Renamed")
+
+    def test_api_requires_internal_token(self):
+        body = json.dumps({"ids": [str(u.id) for u in self.users[:2]]})
+        res = self.client.post("/api/users/resolve/", data=body, content_type="application/json")
+        self.assertEqual(res.status_code, 403)
+
+        with self.settings(INTERNAL_API_TOKEN="secret"):
+            res = self.client.post(
+                "/api/users/resolve/", data=body, content_type="application/json", HTTP_X_INTERNAL_TOKEN="secret"
+            )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(set(res.json()["users"]), {str(u.id) for u in self.users[:2]})
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_are_cached_per_auth_state(self):
+        self.assertEqual(self.client.get("/").headers["X-Page-Cache"], "miss")
+        anonymous = self.client.get("/")
+        self.assertEqual(anonymous.headers["X-Page-Cache"], "hit")
+        self.assertIn("Cookie", anonymous["Vary"])
+
+        self.client.post(
+            "/api/auth/signup/",
+            data='{"email":"p@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+        self.assertEqual(self.client.get("/").headers["X-Page-Cache"], "miss")
+        authenticated = self.client.get("/")
+        self.assertEqual(authenticated.headers["X-Page-Cache"], "hit")
+        self.assertNotEqual(authenticated.content, anonymous.content)
+
+    def test_team_landing_pages_are_cached(self):
+        self.client.get("/team1/")
+        self.assertEqual(self.client.get("/team1/").headers["X-Page-Cache"], "hit")
+
+    def test_pages_that_render_a_csrf_token_are_not_cached(self):
+        @cache_page_per_user()
+        def form_page(request):
+            return HttpResponse(Template("{% csrf_token %}").render(RequestContext(request)))
+
+        factory = RequestFactory()
+        responses = []
+        for _ in range(2):
+            request = factory.get("/form/")
+            request.user = AnonymousUser()
+            responses.append(form_page(request))
+        self.assertNotIn("X-Page-Cache", responses[1].headers)
+        self.assertNotEqual(responses[0].content, responses[1].content)
+
+
+class StaticPipelineTests(TestCase):
+    def setUp(self):
+        self.src = Path(tempfile.mkdtemp()) / "site"
+        self.src.mkdir()
+        (self.src / "app.css").write_text("body { background: url(logo.png); }\n" + "p { margin: 0; }\n" * 100)
+        (self.src / "logo.png").write_bytes(b"png-1")
+        (self.src / "notes.txt").write_text("plain text " * 100)
+        root = tempfile.mkdtemp()
+        override = self.settings(
+            STATIC_ROOT=root,
+            STATICFILES_DIRS=[("site", self.src)],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def collect(self):
+        out = StringIO()
+        call_command("collectstatic", interactive=False, stdout=out)
+        return out.getvalue()
+
+    def test_hashed_compressed_and_immutable(self):
+        self.collect()
+        url = staticfiles_storage.url("site/app.css")
+        self.assertRegex(url, r"^/static/site/app\.[0-9a-f]{12}\.css$")
+        self.assertTrue(staticfiles_storage.exists(url[len("/static/"):] + ".gz"))
+
+        res = Client().get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertEqual(res["Content-Encoding"], "gzip")
+
+    def test_only_changed_files_are_processed(self):
+        self.collect()
+        self.assertNotIn("post-processed", self.collect())
+        css = staticfiles_storage.url("site/app.css")
+
+        # CSS referencing a changed file gets a new name as well.
+        (self.src / "logo.png").write_bytes(b"png-2")
+        os.utime(self.src / "logo.png", (time.time() + 5, time.time() + 5))
+        self.collect()
+        self.assertNotEqual(staticfiles_storage.url("site/app.css"), css)
+        self.assertEqual(
+            set(json.loads(Path(staticfiles_storage.path("staticfiles.json")).read_text())["paths"]),
+            {"site/app.css", "site/logo.png", "site/notes.txt"},
+        )
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        cache.clear()
+
+    def test_server_timing_reports_queries_per_alias_and_templates(self):
+        self.assertNotIn("Server-Timing", self.client.get("/"))
+        with self.settings(SERVER_TIMING_HEADER=True):
+            res = self.client.post(
+                "/api/auth/signup/",
+                data='{"email":"m@test.com","password":"pass1234"}',
+                content_type="application/json",
+            )
+            page = self.client.get("/")
+        self.assertRegex(res["Server-Timing"], r'^total;dur=[\d.]+, db-default;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn("tpl;dur=", page.headers["Server-Timing"])
+
+    def test_metrics_endpoint_aggregates_per_route(self):
+        for _ in range(2):
+            self.client.get("/api/health/")
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+
+        with self.settings(INTERNAL_API_TOKEN="scrape"):
+            res = self.client.get("/api/metrics/", HTTP_X_INTERNAL_TOKEN="scrape")
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = res.content.decode()
+        self.assertIn('app404_request_duration_seconds_count{route="api/health/",method="GET"} 2', body)
+        self.assertIn('app404_request_duration_seconds_bucket{route="api/health/",method="GET",le="+Inf"} 2', body)
+        self.assertIn("app404_user_cache_hits_total", body)
+        self.assertIn("app404_password_hash_completed_total", body)
+
+
+class AuthQueryBudgetTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        get_user_model().objects.create_user(email="budget@test.com", password="pass1234")
+
+    def login(self):
+        return self.client.post(
+            "/api/auth/login/",
+            data='{"email":"budget@test.com","password":"pass1234"}',
+            content_type="application/json",
+        )
+
+    def test_login_me_refresh_logout(self):
+        with QueryBudget({"default": 1}):
+            self.assertEqual(self.login().status_code, 200)
+        with QueryBudget({"default": 1}):
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+        # From here the token's user comes from core.user_cache.
+        with QueryBudget({"default": 0}):
+            self.assertEqual(self.client.get("/api/auth/verify/").status_code, 200)
+        with QueryBudget({"default": 0}):
+            self.assertEqual(self.client.post("/api/auth/refresh/").status_code, 200)
+        with QueryBudget({"default": 1}):  # the token_version bump
+            self.assertEqual(self.client.post("/api/auth/logout/").status_code, 200)
+
+
+class ReadinessTests(TestCase):
+    def setUp(self):
+        readiness.reset()
+        self.addCleanup(readiness.reset)
+
+    def test_probes_default_and_reports_latency(self):
+        with self.settings(READINESS_DATABASES=["default"]):
+            res = self.client.get("/api/health/ready/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["status"], "ok")
+        self.assertIn("latency_ms", res.json()["databases"]["default"])
+
+    def test_critical_alias_failure_fails_readiness(self):
+        def probe(alias):
+            if alias == "team11":
+                raise ConnectionError("wedged")
+            return 0.001
+
+        with mock.patch("core.readiness._probe", side_effect=probe), \
+                self.settings(READINESS_DATABASES=["default", "team11"]):
+            res = self.client.get("/api/health/ready/")
+            self.assertEqual((res.status_code, res.json()["status"]), (200, "degraded"))
+            self.assertEqual(res.json()["databases"]["team11"]["error"], "ConnectionError")
+
+            readiness.reset()
+            with self.settings(READINESS_CRITICAL_DATABASES=["default", "team11"]):
+                res = self.client.get("/api/health/ready/")
+            self.assertEqual((res.status_code, res.json()["status"]), (503, "unavailable"))
+
+    def test_slow_probe_times_out_and_results_are_reused(self):
+        probe = mock.Mock(side_effect=lambda alias: time.sleep(0.3))
+        with mock.patch("core.readiness._probe", probe), \
+                self.settings(READINESS_DATABASES=["default"], READINESS_PROBE_TIMEOUT=0.05):
+            started = time.monotonic()
+            first = self.client.get("/api/health/ready/")
+            self.assertLess(time.monotonic() - started, 0.25)
+            second = self.client.get("/api/health/ready/")
+        self.assertEqual(first.status_code, 503)
+        self.assertEqual(first.json()["databases"]["default"]["error"], "timeout")
+        self.assertEqual(second.json()["databases"], first.json()["databases"])
+        self.assertEqual(probe.call_count, 1)
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.staff = User.objects.create_user(email="prof@test.com", password="pass1234", is_staff=True)
+        User.objects.create_user(email="plain-prof@test.com", password="pass1234")
+        override = self.settings(PROFILING_ENABLED=True, PROFILING_DIR=Path(tempfile.mkdtemp()), PROFILING_KEEP=2)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def login(self, client, email):
+        return client.post(
+            "/api/auth/login/",
+            data=json.dumps({"email": email, "password": "pass1234"}),
+            content_type="application/json",
+        )
+
+    def token(self, *args):
+        out = StringIO()
+        call_command("profile_token", "prof@test.com", *args, stdout=out)
+        return out.getvalue().strip()
+
+    def test_staff_token_profiles_sync_view_and_rotates(self):
+        self.login(self.client, "prof@test.com")
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/db/connections/"))
+
+        token = self.token()
+        for _ in range(3):
+            res = self.client.get("/api/db/connections/", HTTP_X_PROFILE=token)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue((settings.PROFILING_DIR / f"{res['X-Profile-Id']}.prof").exists())
+        self.assertIn("ms", res["X-Profile-Top"])
+        self.assertEqual(len(list(settings.PROFILING_DIR.glob("*.prof"))), 2)
+
+        res = self.client.get(f"/api/db/connections/?_profile={token}")
+        self.assertIn("X-Profile-Id", res)
+
+    def test_overlapping_profiles_run_one_at_a_time(self):
+        request = RequestFactory().get("/api/db/connections/")
+        first, second = profiling.RequestProfile(request), profiling.RequestProfile(request, memory=True)
+        self.assertTrue(first.start())
+        try:
+            self.assertFalse(second.start())
+            self.login(self.client, "prof@test.com")
+            res = self.client.get("/api/db/connections/", HTTP_X_PROFILE=self.token())
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn("X-Profile-Id", res)
+        finally:
+            first.stop()
+        self.assertTrue(second.start())
+        self.assertIn("X-Profile-Id", second.stop())
+
+    def test_token_is_bound_to_its_staff_user(self):
+        token = self.token()
+        self.login(self.client, "plain-prof@test.com")
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/auth/me/", HTTP_X_PROFILE=token))
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/auth/me/", HTTP_X_PROFILE=token + "x"))
+
+    async def test_async_core_view_and_sync_team_view_under_asgi(self):
+        client = AsyncClient()
+        await self.login(client, "prof@test.com")
+        token = await sync_to_async(self.token)("--memory")
+
+        res = await client.get("/api/auth/me/", headers={"X-Profile": token})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("KiB", res["X-Profile-Memory"])
+
+        res = await client.post(
+            "/team11/api/submit-listening/", data="{}", content_type="application/json", headers={"X-Profile": token}
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertTrue((settings.PROFILING_DIR / f"{res['X-Profile-Id']}.mem.txt").exists())
+
+
+class FastJSONTests(TestCase):
+    payload = {
+        "when": datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        "day": datetime.date(2024, 5, 1),
+        "price": decimal.Decimal("1.50"),
+        "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "text": "سلام",
+        "ids": {1: "a"},
+        "huge": 2 ** 70,
+    }
+
+    def test_json_response_matches_django_for_every_backend(self):
+        expected = json.loads(DjangoJsonResponse(self.payload).content)
+        for backend in ("orjson", "json"):
+            with self.settings(JSON_BACKEND=backend):
+                res = fastjson.JsonResponse(self.payload)
+                self.assertEqual(json.loads(res.content), expected)
+                self.assertEqual(res["Content-Type"], "application/json")
+                self.assertEqual(fastjson.loads(res.content), expected)
+        with self.assertRaises(TypeError):
+            fastjson.JsonResponse([1])
+        with self.assertRaises(fastjson.JSONDecodeError):
+            fastjson.loads(b"{nope")
+
+    def test_drf_renderer_and_parser(self):
+        from rest_framework.exceptions import ParseError
+        from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+
+        from core.drf import JSONParser, JSONRenderer
+
+        data = {"text": "a\u2028b", "when": self.payload["when"], "price": self.payload["price"]}
+        rendered = JSONRenderer().render(data)
+        self.assertIn(b"\\u2028", rendered)
+        self.assertEqual(json.loads(rendered), json.loads(DRFJSONRenderer().render(data)))
+        self.assertIn(b"\n", JSONRenderer().render(data, "application/json; indent=2"))
+
+        self.assertEqual(JSONParser().parse(BytesIO(rendered)), json.loads(rendered))
+        with self.assertRaises(ParseError):
+            JSONParser().parse(BytesIO(b"{nope"))
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        ratelimit.reset()
+        self.addCleanup(ratelimit.reset)
+
+    def test_token_bucket_allows_bursts_then_refills(self):
+        bucket = ratelimit.TokenBucket(*ratelimit.parse_rate("3/m"))
+        state, waits = None, []
+        for _ in range(4):
+            state, wait = bucket.hit(state, 1000.0)
+            waits.append(wait)
+        self.assertEqual(waits, [0, 0, 0, 20.0])
+        self.assertEqual(bucket.hit(state, 1020.0)[1], 0)
+
+    def test_sliding_window_weights_the_previous_window(self):
+        window = ratelimit.SlidingWindow(*ratelimit.parse_rate("4/10s"))
+        state = None
+        for _ in range(4):
+            state, wait = window.hit(state, 1001.0)
+            self.assertEqual(wait, 0)
+        state, wait = window.hit(state, 1009.0)
+        self.assertAlmostEqual(wait, 3.5)
+        # Halfway through the next window, half of the previous 4 still count.
+        state, wait = window.hit(state, 1015.0)
+        self.assertEqual(wait, 0)
+        self.assertEqual(window.hit(state, 1015.0)[0][1:], (2, 4))
+        with self.assertRaises(ImproperlyConfigured):
+            ratelimit.parse_rate("5/week")
+
+    def test_sqlite_store_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{tmp}/ratelimit.sqlite3"
+            bucket = ratelimit.TokenBucket(2, 60)
+            first, second = ratelimit.store_from_url(url), ratelimit.store_from_url(url)
+            self.assertEqual(first.hit("k", bucket, 100.0), 0)
+            self.assertEqual(second.hit("k", bucket, 100.0), 0)
+            self.assertEqual(first.hit("k", bucket, 100.0), 30.0)
+            self.assertEqual(second.hit("other", bucket, 100.0), 0)
+
+    def test_login_page_shares_the_login_budget_and_renders_429(self):
+        form = {"email": "page@test.com", "password": "x"}
+        with mock.patch.object(hashing, "aauthenticate", mock.AsyncMock(return_value=None)):
+            for _ in range(5):
+                self.assertEqual(self.client.post("/auth/", form).status_code, 200)
+                res = self.client.post("/api/auth/login/", data=json.dumps(form), content_type="application/json")
+                self.assertEqual(res.status_code, 401)
+            # Viewing the form doesn't count.
+            self.assertEqual(self.client.get("/auth/").status_code, 200)
+            res = self.client.post("/auth/", form)
+        self.assertEqual(res.status_code, 429)
+        self.assertTrue(res["Content-Type"].startswith("text/html"))
+        self.assertGreater(int(res["Retry-After"]), 0)
+        self.assertEqual(self.client.get("/auth/").status_code, 200)
+
+    async def test_login_is_limited_per_address_and_email_under_asgi(self):
+        client = AsyncClient()
+
+        async def login(email, forwarded="203.0.113.7"):
+            res = await client.post("/api/auth/login/", data=json.dumps({"email": email, "password": "x"}),
+                                    content_type="application/json", headers={"X-Forwarded-For": f"10.0.0.1, {forwarded}"})
+            return res.status_code, res
+
+        with mock.patch.object(hashing, "aauthenticate", mock.AsyncMock(return_value=None)):
+            for _ in range(10):
+                self.assertEqual((await login("Student@test.com"))[0], 401)
+            status, res = await login(" student@test.com ")
+            self.assertEqual(status, 429)
+            self.assertEqual(res.json()["retry_after"], int(res["Retry-After"]))
+
+            # Classmates behind the same gateway, and other clients, keep their own buckets.
+            self.assertEqual((await login("other@test.com"))[0], 401)
+            self.assertEqual((await login("student@test.com", forwarded="203.0.113.8"))[0], 401)
+            with self.settings(RATE_LIMIT_ENABLED=False):
+                self.assertEqual((await login("student@test.com"))[0], 401)
+
+    def test_rejected_requests_do_not_use_up_other_rules(self):
+        store = ratelimit.MemoryRateLimitStore()
+        roomy, tight = ratelimit.TokenBucket(5, 60), ratelimit.TokenBucket(1, 60)
+        self.assertEqual(store.hit_many([("a", roomy), ("b", tight)], 100.0), 0)
+        for _ in range(3):
+            self.assertGreater(store.hit_many([("a", roomy), ("b", tight)], 100.0), 0)
+        # Only the allowed request took a token from "a".
+        self.assertEqual([store.hit("a", roomy, 100.0) for _ in range(5)], [0, 0, 0, 0, 60 / 5])
+
+
+
+class CompressionTests(TestCase):
+    def respond(self, response, accept="gzip, deflate, br"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def big_json(self):
+        response = DjangoJsonResponse({"words": [{"term": f"word{i}", "definition": "معنی"} for i in range(200)]})
+        response["ETag"] = '"abc"'
+        return response
+
+    def test_gzip_for_clients_without_brotli(self):
+        original = self.big_json().content
+        res = self.respond(self.big_json(), accept="gzip;q=0.5, br;q=0")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(res.content), original)
+        self.assertEqual(res["Content-Length"], str(len(res.content)))
+        self.assertEqual(res["ETag"], 'W/"abc"')
+        self.assertEqual(res["Vary"], "Accept-Encoding")
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_when_accepted_except_for_html(self):
+        res = self.respond(self.big_json())
+        self.assertEqual(res["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(res.content))["words"][0]["term"], "word0")
+        self.assertEqual(self.respond(HttpResponse("<p>x</p>" * 500))["Content-Encoding"], "gzip")
+
+    def test_small_unlisted_or_unaccepted_responses_pass_through(self):
+        self.assertFalse(self.respond(DjangoJsonResponse({"ok": True})).has_header("Content-Encoding"))
+        self.assertFalse(self.respond(HttpResponse(b"x" * 5000, content_type="image/png")).has_header("Content-Encoding"))
+        self.assertFalse(self.respond(self.big_json(), accept="identity").has_header("Content-Encoding"))
+
+    def test_me_answers_304_while_the_profile_is_unchanged(self):
+        user = User.objects.create_user(email="etag@test.com", password="pass1234", first_name="A")
+        self.client.cookies["access_token"] = create_access_token(user)
+        etag = self.client.get("/api/auth/me/")["ETag"]
+        self.assertEqual(self.client.get("/api/auth/me/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        user.first_name = "B"
+        user.save()
+        res = self.client.get("/api/auth/me/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["user"]["first_name"], "B")
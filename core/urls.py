@@ -8,5 +8,10 @@ urlpatterns = [
     path("auth/logout/", views.logout_api),
     path("auth/me/", views.me),
     path("auth/verify/", views.verify),
+    path("auth/jwks/", views.jwks),
     path("health/", views.health),
+    path("health/ready/", views.ready),
+    path("db/connections/", views.db_connection_stats),
+    path("metrics/", views.metrics_api),
+    path("users/resolve/", views.resolve_users_api),
 ]
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Per-process cache of users resolved from verified access tokens.
+
+The JWT middleware would otherwise run one `User` query per authenticated
+request. Entries are keyed by user id, remember the token_version they were
+loaded with and live until the token's `exp` (capped by a TTL, which also
+bounds how long another worker can keep serving a revoked token).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+# Password and other heavy columns stay deferred on cached instances.
+SNAPSHOT_FIELDS = (
+    "id",
+    "email",
+    "first_name",
+    "last_name",
+    "age",
+    "token_version",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "date_joined",
+    "last_login",
+)
+
+
+class UserSnapshotCache:
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (expires_at, db, values)
+        self._lock = threading.Lock()
+
+    def get(self, user_id, token_version):
+        """Return a fresh User instance for a live entry, else None."""
+        key = str(user_id)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now or entry[2]["token_version"] != token_version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, db, values = entry
+
+        # A new instance per request so views can mutate/save it safely.
+        # from_db() expects values in concrete-field order.
+        model = get_user_model()
+        names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+        return model.from_db(db, names, [values[name] for name in names])
+
+    def set(self, user, expires_at: int):
+        if self.max_size <= 0 or not user.is_active:
+            return
+        expires_at = min(expires_at, time.time() + self.ttl)
+        values = {f: getattr(user, f) for f in SNAPSHOT_FIELDS}
+        key = str(user.pk)
+        with self._lock:
+            self._entries[key] = (expires_at, user._state.db or "default", values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserSnapshotCache(
+    max_size=settings.JWT_USER_CACHE_SIZE,
+    ttl=settings.JWT_USER_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,70 @@
+"""
+Batch lookup of user display fields for team apps.
+
+Team databases only store bare user ids, and a cross-database join isn't
+possible, so listing N rows with their authors used to mean N user queries.
+resolve_users() answers a whole page with one query (one per
+max_query_params ids on SQLite) and caches each user's fields for
+USER_RESOLVE_CACHE_SECONDS:
+
+    users = resolve_users(s.user_id for s in submissions)
+    names = [users.get(s.user_id, {}).get("display_name") for s in submissions]
+
+Services outside this process can call POST /api/users/resolve/.
+"""
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, router
+
+DISPLAY_FIELDS = ("id", "email", "first_name", "last_name")
+CACHE_PREFIX = "core:user-display:"
+
+
+def _display(row) -> dict:
+    full_name = f"{row['first_name']} {row['last_name']}".strip()
+    return {
+        "id": str(row["id"]),
+        "email": row["email"],
+        "first_name": row["first_name"],
+        "last_name": row["last_name"],
+        "display_name": full_name or row["email"].split("@")[0],
+    }
+
+
+def resolve_users(ids) -> dict:
+    """
+    Map each id in `ids` (UUIDs or their strings) to its user's display fields.
+    Ids that aren't UUIDs or don't belong to an active user are left out; the
+    result is keyed by the values passed in.
+    """
+    wanted = {}
+    for original in ids:
+        try:
+            key = original if isinstance(original, uuid.UUID) else uuid.UUID(str(original))
+        except ValueError:
+            continue
+        wanted.setdefault(str(key), []).append(original)
+    if not wanted:
+        return {}
+
+    found = {k[len(CACHE_PREFIX):]: v for k, v in cache.get_many([CACHE_PREFIX + k for k in wanted]).items()}
+    missing = [k for k in wanted if k not in found]
+    if missing:
+        User = get_user_model()
+        db = router.db_for_read(User)
+        chunk = connections[db or "default"].features.max_query_params or len(missing)
+        fetched = {}
+        for start in range(0, len(missing), chunk):
+            rows = User.objects.filter(id__in=missing[start:start + chunk], is_active=True).values(*DISPLAY_FIELDS)
+            fetched.update((str(row["id"]), _display(row)) for row in rows)
+        cache.set_many({CACHE_PREFIX + k: v for k, v in fetched.items()}, settings.USER_RESOLVE_CACHE_SECONDS)
+        found.update(fetched)
+
+    return {original: found[key] for key, originals in wanted.items() if key in found for original in originals}
+
+
+def forget_user(user_id):
+    cache.delete(CACHE_PREFIX + str(user_id))
@@ -1,14 +1,21 @@
-import json
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth import authenticate, get_user_model
+import hmac
+import os
+from django.conf import settings
+from django.http import HttpResponse
+from django.contrib.auth import get_user_model
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 
+from core import db_connections, fastjson, hashing, metrics, readiness
+from core.fastjson import JsonResponse
+from core.jwt_keys import get_key_set
 from core.jwt_utils import create_access_token, create_refresh_token, decode_token
-from core.auth import api_login_required
+from core.auth import api_login_required, csrf_exempt, require_POST
+from core.conditional import conditional, etag_for
+from core.middleware import aload_token_user
+from core.ratelimit import rate_limit
+from core.users import resolve_users
 
 User = get_user_model()
 
@@ -39,17 +46,37 @@ def _clear_auth_cookies(resp: JsonResponse, settings):
     resp.delete_cookie("refresh_token", path="/api/auth/")
 
 
-def health(request):
+def _busy_response(settings):
+    resp = JsonResponse({"error": "Server busy, please retry"}, status=503)
+    resp["Retry-After"] = str(settings.PASSWORD_HASH_RETRY_AFTER)
+    return resp
+
+
+async def health(request):
     return JsonResponse({"status": "ok"})
 
 
+def ready(request):
+    """Readiness for load balancers: 503 when a critical database alias doesn't answer."""
+    report, age = readiness.cached_check()
+    resp = JsonResponse({**report, "age_seconds": age}, status=503 if report["status"] == "unavailable" else 200)
+    resp["Cache-Control"] = "no-store"
+    return resp
+
+
+def jwks(request):
+    resp = JsonResponse(get_key_set().jwks())
+    resp["Cache-Control"] = f"public, max-age={settings.JWT_JWKS_MAX_AGE}"
+    return resp
+
+
 @csrf_exempt
 @require_POST
-def signup_api(request):
+async def signup_api(request):
     from django.conf import settings
 
     try:
-        data = json.loads(request.body.decode("utf-8"))
+        data = fastjson.loads(request.body)
     except Exception:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
@@ -84,16 +111,22 @@ def signup_api(request):
             return JsonResponse({"error": "age must be between 1 and 120"}, status=400)
 
     # ---- Uniqueness
-    if User.objects.filter(email=email).exists():
+    if await User.objects.filter(email=email).aexists():
         return JsonResponse({"error": "email already registered"}, status=409)
 
-    user = User.objects.create_user(
+    try:
+        password_hash = await hashing.ahash_password(password)
+    except hashing.HashingBusy:
+        return _busy_response(settings)
+
+    user = User.objects.build_user(
         email=email,
-        password=password,
         first_name=first_name,
         last_name=last_name,
         age=age,
     )
+    user.password = password_hash
+    await user.asave()
 
     access = create_access_token(user)
     refresh = create_refresh_token(user)
@@ -113,18 +146,23 @@ def signup_api(request):
 
 @csrf_exempt
 @require_POST
-def login_api(request):
+@rate_limit(settings.RATE_LIMIT_LOGIN, key="ip_email", scope="login")
+@rate_limit(settings.RATE_LIMIT_LOGIN_PER_IP, key="ip", algorithm="sliding_window", scope="login")
+async def login_api(request):
     from django.conf import settings
 
     try:
-        data = json.loads(request.body.decode("utf-8"))
+        data = fastjson.loads(request.body)
     except Exception:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
     email = (data.get("email") or "").strip().lower()
     password = data.get("password") or ""
 
-    user = authenticate(request, username=email, password=password)
+    try:
+        user = await hashing.aauthenticate(email, password)
+    except hashing.HashingBusy:
+        return _busy_response(settings)
     if user is None:
         return JsonResponse({"error": "Invalid credentials"}, status=401)
     if not user.is_active:
@@ -140,7 +178,7 @@ def login_api(request):
 
 @csrf_exempt
 @require_POST
-def refresh_api(request):
+async def refresh_api(request):
     from django.conf import settings
 
     rt = request.COOKIES.get("refresh_token")
@@ -152,10 +190,8 @@ def refresh_api(request):
         if payload.get("type") != "refresh":
             return JsonResponse({"error": "Invalid token"}, status=401)
 
-        user_id = payload.get("sub")
-        tv = payload.get("tv")
-        user = User.objects.filter(id=user_id, is_active=True).first()
-        if not user or user.token_version != tv:
+        user = await aload_token_user(payload.get("sub"), payload.get("tv"), payload["exp"])
+        if not user:
             return JsonResponse({"error": "Invalid token"}, status=401)
 
         access = create_access_token(user)
@@ -183,14 +219,20 @@ def logout_api(request):
     return resp
 
 
+def _me_etag(request):
+    u = request.user
+    return etag_for(u.pk, u.email, u.first_name, u.last_name, u.age)
+
+
 @api_login_required
-def me(request):
+@conditional(etag_func=_me_etag)
+async def me(request):
     u = request.user
     return JsonResponse({"ok": True, "user": {"email": u.email, "first_name": u.first_name, "last_name": u.last_name, "age": u.age}})
 
 
 @api_login_required
-def verify(request):
+async def verify(request):
     u = request.user
     resp = JsonResponse({"ok": True})
     resp["X-User-Id"] = str(u.id)
@@ -199,3 +241,53 @@ def verify(request):
     resp["X-User-Last-Name"] = u.last_name or ""
     resp["X-User-Age"] = str(u.age or "")
     return resp
+
+
+@api_login_required
+def db_connection_stats(request):
+    """Connection reuse counters of the worker process that serves the request."""
+    if not request.user.is_staff:
+        return JsonResponse({"detail": "Staff only"}, status=403)
+    return JsonResponse({"pid": os.getpid(), "aliases": db_connections.stats()})
+
+
+def metrics_api(request):
+    """
+    Prometheus text metrics of the one worker process that happens to serve
+    the scrape, not of the whole service (staff or X-Internal-Token).
+    """
+    from django.conf import settings
+
+    if not _is_internal_caller(request, settings):
+        return JsonResponse({"detail": "Forbidden"}, status=403)
+    return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _is_internal_caller(request, settings):
+    # Staff means a JWT: these endpoints are under /api/, whose middleware
+    # chain has no sessions (see MIDDLEWARE_PROFILES).
+    token = request.headers.get("X-Internal-Token", "")
+    if settings.INTERNAL_API_TOKEN and hmac.compare_digest(token, settings.INTERNAL_API_TOKEN):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@csrf_exempt
+@require_POST
+def resolve_users_api(request):
+    """{"ids": [...]} -> {"users": {id: display fields}} for team services (staff or X-Internal-Token)."""
+    from django.conf import settings
+
+    if not _is_internal_caller(request, settings):
+        return JsonResponse({"detail": "Forbidden"}, status=403)
+    try:
+        ids = fastjson.loads(request.body).get("ids")
+    except Exception:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(ids, list) or not all(isinstance(i, (str, int)) for i in ids):
+        return JsonResponse({"error": "ids must be a list"}, status=400)
+    if len(ids) > settings.USER_RESOLVE_MAX_IDS:
+        return JsonResponse({"error": f"at most {settings.USER_RESOLVE_MAX_IDS} ids per request"}, status=400)
+
+    users = resolve_users(str(i) for i in ids)
+    return JsonResponse({"users": users})
@@ -1,23 +1,49 @@
 from django.shortcuts import render, redirect
-from django.views.decorators.http import require_http_methods
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from django.conf import settings
 
+from core import hashing
+from core.auth import require_http_methods
 from core.jwt_utils import create_access_token, create_refresh_token
+from core.ratelimit import rate_limit
 from core.views import _set_auth_cookies  # reuse same cookie logic
 
 User = get_user_model()
 
+BUSY_ERROR = "سرور در حال حاضر شلوغ است. لطفاً چند لحظه دیگر دوباره تلاش کنید."
+THROTTLED_ERROR = "تعداد تلاش‌های ورود بیش از حد مجاز است. لطفاً کمی بعد دوباره تلاش کنید."
 
+
+def _render_busy(request, template):
+    resp = render(request, template, {"error": BUSY_ERROR}, status=503)
+    resp["Retry-After"] = str(settings.PASSWORD_HASH_RETRY_AFTER)
+    return resp
+
+
+def _render_login_throttled(request, retry_after):
+    resp = render(request, "auth/login.html", {"error": THROTTLED_ERROR}, status=429)
+    resp["Retry-After"] = str(retry_after)
+    return resp
+
+
+# Async so that waiting for the hashing pool doesn't tie up a worker. Logins
+# share login_api's limits (scope "login"), so neither bypasses the other.
 @require_http_methods(["GET", "POST"])
-def login_page(request):
+@rate_limit(settings.RATE_LIMIT_LOGIN, key="ip_email", scope="login", methods=["POST"],
+            throttled=_render_login_throttled)
+@rate_limit(settings.RATE_LIMIT_LOGIN_PER_IP, key="ip", algorithm="sliding_window", scope="login",
+            methods=["POST"])
+async def login_page(request):
     error = None
 
     if request.method == "POST":
         email = (request.POST.get("email") or "").strip().lower()
         password = request.POST.get("password") or ""
 
-        user = authenticate(request, username=email, password=password)
+        try:
+            user = await hashing.aauthenticate(email, password)
+        except hashing.HashingBusy:
+            return _render_busy(request, "auth/login.html")
         if user is None:
             error = "ایمیل یا رمز عبور اشتباه است."
         elif not user.is_active:
@@ -33,7 +59,7 @@ def login_page(request):
 
 
 @require_http_methods(["GET", "POST"])
-def signup_page(request):
+async def signup_page(request):
     error = None
 
     if request.method == "POST":
@@ -53,16 +79,21 @@ def signup_page(request):
         if not error:
             if not email or not password:
                 error = "ایمیل و رمز عبور الزامی است."
-            elif User.objects.filter(email=email).exists():
+            elif await User.objects.filter(email=email).aexists():
                 error = "این ایمیل قبلاً ثبت شده است."
             else:
-                user = User.objects.create_user(
+                try:
+                    password_hash = await hashing.ahash_password(password)
+                except hashing.HashingBusy:
+                    return _render_busy(request, "auth/signup.html")
+                user = User.objects.build_user(
                     email=email,
-                    password=password,
                     first_name=first_name,
                     last_name=last_name,
                     age=age,
                 )
+                user.password = password_hash
+                await user.asave()
                 access = create_access_token(user)
                 refresh = create_refresh_token(user)
                 resp = redirect("home")
@@ -1,9 +1,14 @@
 from django.conf import settings
 from django.shortcuts import render
 
+from core.cache import cache_page_per_user
+
+
+@cache_page_per_user()
 def home(request):
     return render(request, "index.html", {"teams": settings.TEAM_APPS})
 
 
+@cache_page_per_user()
 def microservices_page(request):
     return render(request, "microservice.html")    
\ No newline at end of file
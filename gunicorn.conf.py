@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for the core container (loaded automatically from the
+working directory).
+
+APP_SERVER=asgi (default) runs app404.asgi under uvicorn workers: async views
+such as the auth API wait on the database or the hashing pool without holding
+a thread, so one worker serves many concurrent connections. Sync views still
+run in a per-request thread (pool size: ASGI_THREADS). APP_SERVER=wsgi falls
+back to classic sync workers.
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+if os.environ.get("APP_SERVER", "asgi") == "asgi":
+    wsgi_app = "app404.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    # Let uvicorn keep idle keep-alive connections open without a worker each.
+    keepalive = 5
+else:
+    wsgi_app = "app404.wsgi:application"
@@ -1,6 +1,7 @@
 from django.http import JsonResponse
 from django.shortcuts import render
 from core.auth import api_login_required
+from core.cache import cache_page_per_user
 
 TEAM_NAME = "team1"
 
@@ -8,5 +9,6 @@ TEAM_NAME = "team1"
 def ping(request):
     return JsonResponse({"team": TEAM_NAME, "ok": True})
 
+@cache_page_per_user()
 def base(request):
     return render(request, f"{TEAM_NAME}/index.html")
\ No newline at end of file
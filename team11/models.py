@@ -73,6 +73,7 @@ class Submission(models.Model):
     user_id = models.UUIDField(db_index=True)
     submission_type = models.CharField(max_length=20, choices=SubmissionType.choices)
     created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
     overall_score = models.FloatField(null=True, blank=True)
     status = models.CharField(
         max_length=20,
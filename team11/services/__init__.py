@@ -1,3 +1,9 @@
-from .ai_service import assess_writing, assess_speaking
-
+# ai_service pulls in the OpenAI SDK; import it on first use (PEP 562).
 __all__ = ['assess_writing', 'assess_speaking']
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import ai_service
+        return getattr(ai_service, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
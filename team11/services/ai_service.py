@@ -7,6 +7,7 @@ using AI APIs (Deepseek for text analysis, Whisper for audio transcription).
 
 import json
 import logging
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from openai import OpenAI, APIError, APIConnectionError, RateLimitError
 
@@ -23,8 +24,12 @@ logger = logging.getLogger(__name__)
 API_BASE_URL = "https://api.gapgpt.app/v1"
 API_KEY = "sk-NQIf9DDM88vlR7to5iys8BFQYwlHTvbtKZeVlwMawdEMOk61"
 
-# Initialize OpenAI client with a timeout to avoid hanging requests
-client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY, timeout=300.0)
+
+@lru_cache(maxsize=None)
+def get_client() -> OpenAI:
+    """OpenAI client with a timeout to avoid hanging requests, built on first use."""
+    return OpenAI(base_url=API_BASE_URL, api_key=API_KEY, timeout=300.0)
+
 
 # Model names
 DEEPSEEK_MODEL = "deepseek-chat"
@@ -63,7 +68,7 @@ def assess_writing(topic: str, text_body: str, word_count: int) -> Dict[str, Any
         logger.info(f"Assessing writing submission: {word_count} words")
         
         # Make API call with system and user prompts
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=DEEPSEEK_MODEL,
             messages=[
                 {"role": "system", "content": WRITING_SYSTEM_PROMPT},
@@ -166,7 +171,7 @@ def transcribe_audio(audio_file_path: str) -> Dict[str, Any]:
         
         # Open and transcribe the audio file
         with open(audio_file_path, "rb") as audio_file:
-            response = client.audio.transcriptions.create(
+            response = get_client().audio.transcriptions.create(
                 model=WHISPER_MODEL,
                 file=audio_file
             )
@@ -267,7 +272,7 @@ def assess_speaking(topic: str, audio_file_path: str, duration_seconds: int) ->
         
         logger.info(f"Assessing speaking submission: {duration_seconds}s audio")
         
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=DEEPSEEK_MODEL,
             messages=[
                 {"role": "system", "content": SPEAKING_SYSTEM_PROMPT},
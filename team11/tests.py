@@ -1,8 +1,18 @@
 from pathlib import Path
+from unittest import mock
 
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from core import ratelimit
+from core.jwt_utils import create_access_token
+from core.testing import QueryBudget
 from openai import OpenAI, APIError, APIConnectionError, RateLimitError
 
+from . import views
+from .models import AnalysisStatus, AssessmentResult, Submission, SubmissionType, WritingSubmission
 from .services import assess_writing, assess_speaking
 from .services.ai_service import API_BASE_URL, API_KEY, DEEPSEEK_MODEL
 
@@ -92,3 +102,104 @@ class Team11AISmokeTests(TestCase):
 
         self.assertTrue(result.get("success"), msg=result.get("error"))
         self.assertIsNotNone(result.get("overall_score"))
+
+
+class DashboardFragmentCacheTests(TestCase):
+    databases = {"default", "team11"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email="frag@test.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.submission = Submission.objects.using("team11").create(
+            user_id=self.user.id,
+            submission_type=SubmissionType.WRITING,
+            status=AnalysisStatus.IN_PROGRESS,
+        )
+        WritingSubmission.objects.using("team11").create(
+            submission=self.submission, topic="Cities", text_body="Big cities are busy.", word_count=4
+        )
+
+    def test_history_is_cached_until_an_assessment_commits(self):
+        self.client.get("/team11/dashboard/")
+        # Only the version aggregate; the fragments come from the cache.
+        with self.assertNumQueries(1, using="team11"):
+            self.client.get("/team11/dashboard/")
+
+        result = {
+            "success": True, "overall_score": 4.5, "grammar_score": 4, "vocabulary_score": 5,
+            "coherence_score": 4, "fluency_score": 5, "feedback_summary": "Good", "suggestions": [],
+        }
+        with mock.patch.object(views.services, "assess_writing", return_value=result):
+            views._process_writing_assessment(self.submission.submission_id, "Cities", "Big cities are busy.", 4)
+
+        self.assertContains(self.client.get("/team11/dashboard/"), "4.5")
+
+    def test_history_version_follows_writes_from_other_processes(self):
+        self.client.get("/team11/dashboard/")
+        # A save that never touches this process's cache, as in another worker.
+        Submission.objects.using("team11").filter(pk=self.submission.pk).update(
+            status=AnalysisStatus.COMPLETED, overall_score=3.5, updated_at=timezone.now()
+        )
+        self.assertContains(self.client.get("/team11/dashboard/"), "3.5")
+
+    def test_query_budgets(self):
+        # Session and user lookups on default; the history version, the history
+        # list, the totals and the chart series.
+        with QueryBudget({"default": 2, "team11": 4}):
+            self.client.get("/team11/dashboard/")
+        with QueryBudget({"default": 2, "team11": 1}):
+            res = self.client.get(f"/team11/submission/{self.submission.submission_id}/")
+        self.assertEqual(res.status_code, 200)
+
+    def test_submission_detail_answers_304_until_it_is_assessed(self):
+        url = f"/team11/submission/{self.submission.submission_id}/"
+        etag = self.client.get(url)["ETag"]
+        with QueryBudget({"default": 2, "team11": 1}), self.assertTemplateNotUsed("team11/submission_detail.html"):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with mock.patch.object(views.services, "assess_writing", return_value={"success": False, "error": "x"}):
+            views._process_writing_assessment(self.submission.submission_id, "Cities", "Big cities are busy.", 4)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+    def test_detail_fragment_follows_a_result_written_after_the_status(self):
+        url = f"/team11/submission/{self.submission.submission_id}/"
+        self.submission.status = AnalysisStatus.COMPLETED
+        self.submission.overall_score = 4.5
+        self.submission.save()
+        # Rendered between the background task's two writes.
+        self.assertNotContains(self.client.get(url), "Well organised")
+
+        AssessmentResult.objects.using("team11").create(submission=self.submission, feedback_summary="Well organised")
+        self.assertContains(self.client.get(url), "Well organised")
+
+
+class SubmitRateLimitTests(TestCase):
+    databases = {"default", "team11"}
+
+    def setUp(self):
+        ratelimit.reset()
+        self.addCleanup(ratelimit.reset)
+
+    def login(self, email):
+        user = get_user_model().objects.create_user(email=email, password="pass1234")
+        self.client.cookies["access_token"] = create_access_token(user)
+
+    def submit(self):
+        return self.client.post("/team11/api/submit-writing/", data="{}", content_type="application/json")
+
+    def test_submissions_are_limited_per_user_before_any_query(self):
+        self.login("rl1@test.com")
+        for _ in range(5):
+            self.assertEqual(self.submit().status_code, 400)
+        with QueryBudget({}):
+            res = self.submit()
+        self.assertEqual(res.status_code, 429)
+        self.assertGreaterEqual(int(res["Retry-After"]), 1)
+
+        # Each user has their own budget, and each endpoint its own.
+        self.assertEqual(self.client.post("/team11/api/submit-listening/", data="{}",
+                                          content_type="application/json").status_code, 400)
+        self.login("rl2@test.com")
+        self.assertEqual(self.submit().status_code, 400)
@@ -1,41 +1,62 @@
-import json
 import os
 import logging
 import random
 import threading
 from django.db import close_old_connections
-from django.db.models import Avg
-from django.http import JsonResponse
+from django.db.models import Avg, Count, Max, Q
 from django.shortcuts import render, get_object_or_404
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from core import db_router, fastjson
 from core.auth import api_login_required
+from core.cache import cache_page_per_user
+from core.conditional import etag_for, not_modified, with_validators
+from core.fastjson import JsonResponse
+from core.ratelimit import rate_limit
 from .models import (
     Submission, WritingSubmission, ListeningSubmission, 
     AssessmentResult, SubmissionType, AnalysisStatus,
     QuestionCategory, Question
 )
-from .services import assess_writing, assess_speaking
+from . import services
 
 logger = logging.getLogger(__name__)
 
 TEAM_NAME = "team11"
 
-
+def _history_version(user_id):
+    """
+    Version in the dashboard fragment cache keys, read from the user's
+    submissions so every worker sees a change as soon as it commits: new
+    and deleted submissions, saves (updated_at), and assessment results and
+    details written after their submission.
+    """
+    return etag_for(*Submission.objects.filter(user_id=user_id).aggregate(
+        count=Count('pk'),
+        updated=Max('updated_at'),
+        results=Count('assessment_result'),
+        assessed=Max('assessment_result__created_at'),
+        details=Count('writing_details') + Count('listening_details'),
+    ).values())
+
+
+# Background threads read the rows their request has just written.
+@db_router.scope(sticky={"team11"})
 def _process_writing_assessment(submission_id, topic, text_body, word_count):
     try:
         close_old_connections()
         logger.info(f"Writing background task started: {submission_id}")
-        assessment_result = assess_writing(topic, text_body, word_count)
-        submission = Submission.objects.using('team11').get(submission_id=submission_id)
+        assessment_result = services.assess_writing(topic, text_body, word_count)
+        submission = Submission.objects.get(submission_id=submission_id)
 
         if assessment_result.get('success'):
             submission.overall_score = assessment_result['overall_score']
             submission.status = AnalysisStatus.COMPLETED
             submission.save()
 
-            AssessmentResult.objects.using('team11').update_or_create(
+            AssessmentResult.objects.update_or_create(
                 submission=submission,
                 defaults={
                     'grammar_score': assessment_result['grammar_score'],
@@ -52,7 +73,7 @@ def _process_writing_assessment(submission_id, topic, text_body, word_count):
         error_msg = 'ارزیابی ناموفق بود. لطفاً دوباره تلاش کنید.'
         submission.status = AnalysisStatus.FAILED
         submission.save()
-        AssessmentResult.objects.using('team11').update_or_create(
+        AssessmentResult.objects.update_or_create(
             submission=submission,
             defaults={
                 'feedback_summary': error_msg,
@@ -64,20 +85,21 @@ def _process_writing_assessment(submission_id, topic, text_body, word_count):
         logger.error(f"Background writing assessment error: {e}", exc_info=True)
         try:
             close_old_connections()
-            submission = Submission.objects.using('team11').get(submission_id=submission_id)
+            submission = Submission.objects.get(submission_id=submission_id)
             submission.status = AnalysisStatus.FAILED
             submission.save()
         except Exception:
             pass
 
 
+@db_router.scope(sticky={"team11"})
 def _process_listening_assessment(submission_id, listening_detail_pk, audio_file_path, topic, duration, temp_file_path=None):
     try:
         close_old_connections()
         logger.info(f"Speaking background task started: {submission_id}")
-        assessment_result = assess_speaking(topic, audio_file_path, duration)
-        submission = Submission.objects.using('team11').get(submission_id=submission_id)
-        listening_detail = ListeningSubmission.objects.using('team11').get(pk=listening_detail_pk)
+        assessment_result = services.assess_speaking(topic, audio_file_path, duration)
+        submission = Submission.objects.get(submission_id=submission_id)
+        listening_detail = ListeningSubmission.objects.get(pk=listening_detail_pk)
 
         if assessment_result.get('success'):
             listening_detail.transcription = assessment_result.get('transcription', '')
@@ -87,7 +109,7 @@ def _process_listening_assessment(submission_id, listening_detail_pk, audio_file
             submission.status = AnalysisStatus.COMPLETED
             submission.save()
 
-            AssessmentResult.objects.using('team11').update_or_create(
+            AssessmentResult.objects.update_or_create(
                 submission=submission,
                 defaults={
                     'pronunciation_score': assessment_result['pronunciation_score'],
@@ -109,7 +131,7 @@ def _process_listening_assessment(submission_id, listening_detail_pk, audio_file
 
         submission.status = AnalysisStatus.FAILED
         submission.save()
-        AssessmentResult.objects.using('team11').update_or_create(
+        AssessmentResult.objects.update_or_create(
             submission=submission,
             defaults={
                 'feedback_summary': error_msg,
@@ -121,7 +143,7 @@ def _process_listening_assessment(submission_id, listening_detail_pk, audio_file
         logger.error(f"Background listening assessment error: {e}", exc_info=True)
         try:
             close_old_connections()
-            submission = Submission.objects.using('team11').get(submission_id=submission_id)
+            submission = Submission.objects.get(submission_id=submission_id)
             submission.status = AnalysisStatus.FAILED
             submission.save()
         except Exception:
@@ -140,54 +162,62 @@ def ping(request):
     return JsonResponse({"team": TEAM_NAME, "ok": True})
 
 
+@cache_page_per_user()
 def base(request):
     """Landing page for Team 11 microservice"""
     return render(request, f"{TEAM_NAME}/index.html")
 
 
+def _dashboard_stats(user_id):
+    completed_submissions = Submission.objects.filter(
+        user_id=user_id,
+        status=AnalysisStatus.COMPLETED,
+        overall_score__isnull=False
+    )
+    totals = completed_submissions.aggregate(
+        completed_count=Count('pk'),
+        writing_avg=Avg('overall_score', filter=Q(submission_type=SubmissionType.WRITING)),
+        speaking_avg=Avg('overall_score', filter=Q(submission_type=SubmissionType.LISTENING)),
+    )
+
+    writing_series = []
+    speaking_series = []
+    for s in completed_submissions.order_by('created_at').only('submission_type', 'created_at', 'overall_score'):
+        series = writing_series if s.submission_type == SubmissionType.WRITING else speaking_series
+        series.append({
+            'date': s.created_at.strftime('%Y/%m/%d'),
+            'score': s.overall_score,
+        })
+
+    writing_avg = totals['writing_avg']
+    speaking_avg = totals['speaking_avg']
+    return {
+        'completed_count': totals['completed_count'],
+        'writing_avg': round(writing_avg, 2) if writing_avg is not None else 0,
+        'speaking_avg': round(speaking_avg, 2) if speaking_avg is not None else 0,
+        'writing_series': writing_series,
+        'speaking_series': speaking_series,
+    }
+
+
 @api_login_required
 def dashboard(request):
     """Dashboard showing user's submission history"""
     user_id = request.user.id
     
-    # Get all submissions for the user with related data
-    submissions = Submission.objects.using('team11').filter(user_id=user_id).select_related(
+    # The history list and charts are cached fragments: the queryset and the
+    # stats below are only evaluated when a fragment has to be rendered again.
+    submissions = Submission.objects.filter(user_id=user_id).select_related(
         'assessment_result',
-        'writing_details',
-        'listening_details'
+        'writing_details__question',
+        'listening_details__question'
     ).order_by('-created_at')
-    
-    completed_submissions = submissions.filter(status=AnalysisStatus.COMPLETED, overall_score__isnull=False)
-    completed_count = completed_submissions.count()
-
-    writing_completed = completed_submissions.filter(submission_type=SubmissionType.WRITING).order_by('created_at')
-    speaking_completed = completed_submissions.filter(submission_type=SubmissionType.LISTENING).order_by('created_at')
-
-    writing_avg = writing_completed.aggregate(avg=Avg('overall_score'))['avg']
-    speaking_avg = speaking_completed.aggregate(avg=Avg('overall_score'))['avg']
-
-    writing_series = [
-        {
-            'date': s.created_at.strftime('%Y/%m/%d'),
-            'score': s.overall_score,
-        }
-        for s in writing_completed
-    ]
-    speaking_series = [
-        {
-            'date': s.created_at.strftime('%Y/%m/%d'),
-            'score': s.overall_score,
-        }
-        for s in speaking_completed
-    ]
 
     context = {
         'submissions': submissions,
-        'completed_count': completed_count,
-        'writing_avg': round(writing_avg, 2) if writing_avg is not None else 0,
-        'speaking_avg': round(speaking_avg, 2) if speaking_avg is not None else 0,
-        'writing_series': writing_series,
-        'speaking_series': speaking_series,
+        'stats': SimpleLazyObject(lambda: _dashboard_stats(user_id)),
+        'history_version': _history_version(user_id),
+        'fragment_ttl': settings.PAGE_CACHE_SECONDS,
     }
     return render(request, f"{TEAM_NAME}/dashboard.html", context)
 
@@ -195,12 +225,12 @@ def dashboard(request):
 @api_login_required
 def start_exam(request):
     """Page to select exam type and category"""
-    writing_categories = QuestionCategory.objects.using('team11').filter(
+    writing_categories = QuestionCategory.objects.filter(
         question_type=SubmissionType.WRITING,
         is_active=True
     ).prefetch_related('questions')
     
-    listening_categories = QuestionCategory.objects.using('team11').filter(
+    listening_categories = QuestionCategory.objects.filter(
         question_type=SubmissionType.LISTENING,
         is_active=True
     ).prefetch_related('questions')
@@ -218,13 +248,13 @@ def writing_exam(request):
     category_id = request.GET.get('category')
     
     if category_id:
-        questions = Question.objects.using('team11').filter(
+        questions = Question.objects.filter(
             category_id=category_id,
             category__question_type=SubmissionType.WRITING,
             is_active=True
         )
     else:
-        questions = Question.objects.using('team11').filter(
+        questions = Question.objects.filter(
             category__question_type=SubmissionType.WRITING,
             is_active=True
         )
@@ -244,13 +274,13 @@ def listening_exam(request):
     category_id = request.GET.get('category')
     
     if category_id:
-        questions = Question.objects.using('team11').filter(
+        questions = Question.objects.filter(
             category_id=category_id,
             category__question_type=SubmissionType.LISTENING,
             is_active=True
         )
     else:
-        questions = Question.objects.using('team11').filter(
+        questions = Question.objects.filter(
             category__question_type=SubmissionType.LISTENING,
             is_active=True
         )
@@ -266,11 +296,13 @@ def listening_exam(request):
 
 @csrf_exempt
 @require_POST
+@rate_limit(settings.RATE_LIMIT_TEAM11_SUBMIT)
+@rate_limit(settings.RATE_LIMIT_TEAM11_SUBMIT_HOURLY, algorithm="sliding_window")
 @api_login_required
 def submit_writing(request):
     """API endpoint to submit writing task"""
     try:
-        data = json.loads(request.body)
+        data = fastjson.loads(request.body)
         question_id = data.get('question_id', '')
         topic = data.get('topic', '')
         text_body = data.get('text_body', '')
@@ -284,19 +316,19 @@ def submit_writing(request):
         question = None
         if question_id:
             try:
-                question = Question.objects.using('team11').get(question_id=question_id)
+                question = Question.objects.get(question_id=question_id)
             except Question.DoesNotExist:
                 pass
         
         # Create submission with pending status
-        submission = Submission.objects.using('team11').create(
+        submission = Submission.objects.create(
             user_id=request.user.id,
             submission_type=SubmissionType.WRITING,
             status=AnalysisStatus.IN_PROGRESS
         )
         
         # Create writing details
-        WritingSubmission.objects.using('team11').create(
+        WritingSubmission.objects.create(
             submission=submission,
             question=question,
             topic=topic,
@@ -327,6 +359,8 @@ def submit_writing(request):
 
 @csrf_exempt
 @require_POST
+@rate_limit(settings.RATE_LIMIT_TEAM11_SUBMIT)
+@rate_limit(settings.RATE_LIMIT_TEAM11_SUBMIT_HOURLY, algorithm="sliding_window")
 @api_login_required
 def submit_listening(request):
     """API endpoint to submit listening (audio) task"""
@@ -340,7 +374,7 @@ def submit_listening(request):
     logger.info("=" * 80)
     
     try:
-        data = json.loads(request.body)
+        data = fastjson.loads(request.body)
         question_id = data.get('question_id', '')
         topic = data.get('topic', '')
         audio_data = data.get('audio_data', '')
@@ -356,19 +390,19 @@ def submit_listening(request):
         question = None
         if question_id:
             try:
-                question = Question.objects.using('team11').get(question_id=question_id)
+                question = Question.objects.get(question_id=question_id)
             except Question.DoesNotExist:
                 pass
         
         # Create submission with pending status
-        submission = Submission.objects.using('team11').create(
+        submission = Submission.objects.create(
             user_id=user_id,
             submission_type=SubmissionType.LISTENING,
             status=AnalysisStatus.IN_PROGRESS
         )
         
         # Create listening details (without transcription initially)
-        listening_detail = ListeningSubmission.objects.using('team11').create(
+        listening_detail = ListeningSubmission.objects.create(
             submission=submission,
             question=question,
             topic=topic,
@@ -463,18 +497,33 @@ def submit_listening(request):
 def submission_detail(request, submission_id):
     """View detailed results for a specific submission"""
     submission = get_object_or_404(
-        Submission.objects.using('team11').select_related('assessment_result'),
+        Submission.objects.select_related(
+            'assessment_result',
+            'writing_details__question',
+            'listening_details__question'
+        ),
         submission_id=submission_id,
         user_id=request.user.id
     )
+    # The page only changes with the submission row, its result (written
+    # once, just after the final status) or a deploy.
+    result = getattr(submission, 'assessment_result', None)
+    last_modified = max(submission.updated_at, result.created_at) if result else submission.updated_at
+    etag = etag_for(submission.submission_id, submission.updated_at, result and result.pk, settings.PAGE_CACHE_VERSION)
+    unchanged = not_modified(request, etag, last_modified)
+    if unchanged is not None:
+        return unchanged
 
     if submission.status in [AnalysisStatus.IN_PROGRESS, AnalysisStatus.PENDING]:
-        return render(request, f"{TEAM_NAME}/submission_detail.html", {
+        response = render(request, f"{TEAM_NAME}/submission_detail.html", {
             'submission': submission,
             'details': None,
             'result': None,
             'processing': True,
+            'fragment_ttl': settings.PAGE_CACHE_SECONDS,
+            'etag': etag,
         })
+        return with_validators(response, etag, last_modified)
     
     # Get type-specific details using select_related (OneToOne relationship)
     details = None
@@ -492,17 +541,21 @@ def submission_detail(request, submission_id):
     context = {
         'submission': submission,
         'details': details,
-        'result': submission.assessment_result if hasattr(submission, 'assessment_result') else None,
+        'result': result,
         'processing': False,
+        'fragment_ttl': settings.PAGE_CACHE_SECONDS,
+        # The fragment varies on the validators' inputs, so a result written
+        # after the final status can't be hidden behind a newer ETag.
+        'etag': etag,
     }
-    return render(request, f"{TEAM_NAME}/submission_detail.html", context)
+    return with_validators(render(request, f"{TEAM_NAME}/submission_detail.html", context), etag, last_modified)
 
 
 @api_login_required
 @require_http_methods(["GET"])
 def submission_status(request, submission_id):
     submission = get_object_or_404(
-        Submission.objects.using('team11').select_related('assessment_result'),
+        Submission.objects.select_related('assessment_result'),
         submission_id=submission_id,
         user_id=request.user.id
     )
@@ -1,6 +1,33 @@
 from django.test import TestCase
 
+from core.testing import QueryBudget
+from .models import ListeningPracticeAnswer, ListeningPracticeSession
+
 class TeamPingTests(TestCase):
     def test_ping_requires_auth(self):
         res = self.client.get("/team12/ping/")
         self.assertEqual(res.status_code, 401)
+
+
+class ListeningPracticeQueryBudgetTests(TestCase):
+    databases = {"default", "team12"}
+
+    def setUp(self):
+        self.session = ListeningPracticeSession.objects.create()
+        ListeningPracticeAnswer.objects.bulk_create(
+            ListeningPracticeAnswer(session=self.session, question_number=n, selected_choice="a", is_correct=n % 2 == 0)
+            for n in range(10)
+        )
+
+    def test_answer_and_result(self):
+        with QueryBudget({"team12": 2}):
+            res = self.client.post(
+                "/team12/listening/practice/answer/",
+                data={"session_id": self.session.id, "question_number": 10, "selected_choice": "b"},
+                content_type="application/json",
+            )
+        self.assertEqual(res.status_code, 200)
+        # Session, finishing it, then the answers in one query.
+        with QueryBudget({"team12": 3}):
+            res = self.client.get(f"/team12/listening/practice/result/{self.session.id}/")
+        self.assertEqual(res.context["score"], 5)
@@ -1,12 +1,12 @@
-import json
-
-from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
+from core import fastjson
 from core.auth import api_login_required
+from core.cache import cache_page_per_user
+from core.fastjson import JsonResponse
 from .models import (
     ListeningEventLog,
     ListeningPracticeAnswer,
@@ -19,6 +19,7 @@ TEAM_NAME = "team12"
 def ping(request):
     return JsonResponse({"team": TEAM_NAME, "ok": True})
 
+@cache_page_per_user()
 def base(request):
     return render(request, f"{TEAM_NAME}/index.html")
 
@@ -42,8 +43,8 @@ def listening_practice(request):
 
 def _parse_json(request):
     try:
-        return json.loads(request.body or "{}")
-    except json.JSONDecodeError:
+        return fastjson.loads(request.body or "{}")
+    except fastjson.JSONDecodeError:
         return None
 
 
@@ -60,7 +61,7 @@ def listening_practice_start(request):
     if request.method != "POST":
         return JsonResponse({"error": "POST required"}, status=405)
 
-    session = ListeningPracticeSession.objects.using("team12").create(
+    session = ListeningPracticeSession.objects.create(
         user_id=getattr(request.user, "id", None)
     )
     return JsonResponse({"session_id": session.id})
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('team9', '0004_alter_word_next_review_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lesson',
+            name='user_id',
+            field=models.IntegerField(db_index=True),
+        ),
+    ]
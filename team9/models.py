@@ -7,10 +7,11 @@ from datetime import date, timedelta
 
 class Lesson(models.Model):
     # User ID retrieved from the Core service cookies
-    user_id = models.IntegerField() 
+    user_id = models.IntegerField(db_index=True)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.title} (User: {self.user_id})"
@@ -72,6 +73,9 @@ class Word(models.Model):
     # Next scheduled review date based on spaced repetition
     next_review_date = models.DateField(default=date.today)
 
+    # Feeds the ETags of the lesson and word endpoints.
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.term
     
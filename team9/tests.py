@@ -1,6 +1,65 @@
 from django.test import TestCase
 
+from core.testing import QueryBudget
+from .models import Lesson, Word
+
 class TeamPingTests(TestCase):
     def test_ping_requires_auth(self):
         res = self.client.get("/team9/ping/")
         self.assertEqual(res.status_code, 401)
+
+
+class LessonQueryBudgetTests(TestCase):
+    databases = {"default", "team9"}
+
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(5):
+            lesson = Lesson.objects.create(user_id=n % 2, title=f"Lesson {n}")
+            Word.objects.bulk_create(
+                Word(lesson=lesson, term=f"word{n}-{i}", definition="-", review_history="11000000")
+                for i in range(4)
+            )
+
+    def test_list_nests_words_without_a_query_per_lesson(self):
+        with QueryBudget({"team9": 2}, allow_scans={"team9_lesson"}):
+            res = self.client.get("/team9/api/lessons/")
+        self.assertEqual(len(res.json()), 5)
+        self.assertEqual(res.json()[0]["progress_percent"], 33.3)
+
+    def test_list_for_one_user_uses_an_index(self):
+        with QueryBudget({"team9": 2}):
+            res = self.client.get("/team9/api/lessons/?user_id=1")
+        self.assertEqual(len(res.json()), 2)
+
+
+class ConditionalGetTests(TestCase):
+    databases = {"default", "team9"}
+
+    def setUp(self):
+        self.lesson = Lesson.objects.create(user_id=1, title="Food")
+        self.word = Word.objects.create(lesson=self.lesson, term="apple", definition="سیب")
+        Word.objects.create(lesson=self.lesson, term="bread", definition="نان")
+
+    def test_lesson_revalidates_until_a_word_changes(self):
+        url = f"/team9/api/lessons/{self.lesson.pk}/"
+        res = self.client.get(url)
+        self.assertEqual(res["Cache-Control"], "private, no-cache")
+        self.assertIn("Last-Modified", res)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b"")
+
+        self.client.post(f"/team9/api/words/{self.word.pk}/review/", {"is_correct": True}, content_type="application/json")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 200)
+
+    def test_word_list_etag_follows_the_filtered_rows(self):
+        url = f"/team9/api/words/?lesson={self.lesson.pk}"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.word.delete()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()), 1)
@@ -1,6 +1,8 @@
-from django.http import JsonResponse
 from django.shortcuts import render
 from core.auth import api_login_required
+from core.cache import cache_page_per_user
+from core.conditional import etag_for, not_modified, with_validators
+from core.fastjson import JsonResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -20,6 +22,7 @@ def ping(request):
     # Standard health check for the core system
     return JsonResponse({"team": TEAM_NAME, "ok": True})
 
+@cache_page_per_user()
 def base(request):
     # Renders the main index page
     return render(request, f"{TEAM_NAME}/index.html")
@@ -42,7 +45,9 @@ class LessonViewSet(viewsets.ModelViewSet):
     - user_id: Filter by user ID
     - ordering: Order by created_at (e.g., ?ordering=-created_at for descending)
     """
-    queryset = Lesson.objects.all()
+    # The serializer nests words and progress_percent reads them again:
+    # fetch them for the whole page in one query.
+    queryset = Lesson.objects.prefetch_related('words')
     serializer_class = LessonSerializer
     
     # Enable filter backends
@@ -58,6 +63,20 @@ class LessonViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at']
     ordering = ['-created_at']  # Default ordering
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Lesson with its words, or 304 if the client's copy is current.
+        The validators come from the rows already loaded, before serialising.
+        """
+        lesson = self.get_object()
+        words = lesson.words.all()
+        etag = etag_for(request.accepted_renderer.format, lesson.pk, lesson.updated_at,
+                        [(w.pk, w.updated_at) for w in words])
+        last_modified = max([lesson.updated_at, *(w.updated_at for w in words)])
+        return not_modified(request, etag, last_modified) or with_validators(
+            Response(self.get_serializer(lesson).data), etag, last_modified
+        )
+
 class WordViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Word model with advanced search, filtering, and ordering.
@@ -119,6 +138,18 @@ class WordViewSet(viewsets.ModelViewSet):
             )
         
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Words matching the filters, or 304 if the client's copy is current.
+        The ETag covers which rows match and when each last changed, plus the
+        date, since "due today" filters move with it.
+        """
+        words = list(self.filter_queryset(self.get_queryset()))
+        etag = etag_for(request.accepted_renderer.format, date.today(), [(w.pk, w.updated_at) for w in words])
+        return not_modified(request, etag) or with_validators(
+            Response(self.get_serializer(words, many=True).data), etag
+        )
     
     @action(detail=True, methods=['post'])
     def review(self, request, pk=None):